@@ -1,4 +1,5 @@
 from django.contrib import admin
+from .cache import bump_post_versions
 from .models import Category, Comment, Post
 
 
@@ -11,10 +12,17 @@ class CategoryInline(admin.TabularInline):
 
 
 class PostAdmin(admin.ModelAdmin):
-    list_display = ["id", "title", "text", "post_date"]
+    list_display = ["id", "title", "text", "post_date", "status", "comment_count"]
+    list_filter = ["status"]
     inlines = [CategoryInline, CommentInline]
     ordering = ["title"]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Rows of the auto-created Category.posts table saved by CategoryInline
+        # don't send model signals, so invalidate the post's fragments here.
+        bump_post_versions([form.instance.pk])
+
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ["post", "author", "text", "created_time"]
@@ -0,0 +1,82 @@
+from django.contrib.auth.models import User
+from django.urls import path
+
+from django_blog.api import Expansion, Resource
+
+from .models import Category, Comment, Post
+
+AUTHOR_FIELDS = {"id": "id", "username": "username"}
+
+
+class PostResource(Resource):
+    queryset = Post.objects.published()
+    fields = {
+        "id": "id",
+        "title": "title",
+        "text": "text",
+        "author": "author__username",
+        "created_date": "created_date",
+        "modified_date": "modified_date",
+        "post_date": "post_date",
+        "comment_count": "comment_count",
+        "last_comment_at": "last_comment_at",
+    }
+    expansions = {
+        "author": Expansion("author_id", User.objects.all(), "id", AUTHOR_FIELDS),
+        "categories": Expansion(
+            "id",
+            Category.posts.through.objects.all(),
+            "post_id",
+            {"id": "category_id", "name": "category__name"},
+            many=True,
+        ),
+    }
+    ordering = ("-post_date", "-id")
+
+
+class CategoryPostResource(PostResource):
+    def get_queryset(self, category_pk):
+        return super().get_queryset().filter(categories=category_pk)
+
+
+class CommentResource(Resource):
+    queryset = Comment.objects.all()
+    fields = {
+        "id": "id",
+        "post": "post_id",
+        "author": "author__username",
+        "text": "text",
+        "created_time": "created_time",
+    }
+    expansions = {
+        "author": Expansion("author_id", User.objects.all(), "id", AUTHOR_FIELDS),
+    }
+    ordering = ("created_time", "id")
+
+    def get_queryset(self, post_pk):
+        return self.queryset.filter(post=post_pk, post__in=Post.objects.published())
+
+
+class CategoryResource(Resource):
+    queryset = Category.objects.all()
+    fields = {"id": "id", "name": "name", "description": "description"}
+    ordering = ("id",)
+
+
+posts = PostResource()
+comments = CommentResource()
+categories = CategoryResource()
+category_posts = CategoryPostResource()
+
+urlpatterns = [
+    path("posts/", posts.list_view, name="api_posts"),
+    path("posts/<int:pk>/", posts.detail_view, name="api_post"),
+    path("posts/<int:post_pk>/comments/", comments.list_view, name="api_comments"),
+    path("categories/", categories.list_view, name="api_categories"),
+    path("categories/<int:pk>/", categories.detail_view, name="api_category"),
+    path(
+        "categories/<int:category_pk>/posts/",
+        category_posts.list_view,
+        name="api_category_posts",
+    ),
+]
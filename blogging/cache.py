@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import Counter
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from django_blog.db import read_from_replica
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+VERSION_KEY = "blogging:post:{pk}:version"
+GENERATION_KEY = "blogging:posts:generation"
+FRAGMENT_KEY = "blogging:fragment:{name}:{pk}:{version}"
+DASHBOARD_KEY = "blogging:dashboard:{pk}"
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[getattr(settings, "BLOGGING_FRAGMENT_CACHE", "default")]
+
+
+def cache_is_shared():
+    """Whether other processes see the version tokens this one sets."""
+    return not isinstance(get_cache(), LocMemCache)
+
+
+def _new_version(written_at=0):
+    # Random, so a version that was evicted can never come back and match
+    # fragments rendered before the eviction. Tagged with the time of the
+    # write that bumped it, if any.
+    return f"{uuid4().hex}:{written_at:.0f}"
+
+
+def is_settled(*versions):
+    """Whether content rendered under ``versions`` may be cached. Not when
+    the request read from a replica within ``DATABASE_PIN_SECONDS`` of the
+    write behind one of them, since the replica may not show it yet."""
+    if not read_from_replica():
+        return True
+    settled = time.time() - settings.DATABASE_PIN_SECONDS
+    for version in versions:
+        _, _, written_at = str(version).rpartition(":")
+        if written_at.isdigit() and int(written_at) > settled:
+            return False
+    return True
+
+
+def post_version(pk):
+    """Return the current version token of a post, creating one if the cache
+    has none."""
+    key = VERSION_KEY.format(pk=pk)
+    return get_cache().get_or_set(key, _new_version(), None)
+
+
+def post_versions(pks):
+    """post_version() of several posts, read with one cache call."""
+    keys = [VERSION_KEY.format(pk=pk) for pk in pks]
+    cache = get_cache()
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            found[key] = cache.get_or_set(key, _new_version(), None)
+    return [found[key] for key in keys]
+
+
+def posts_generation():
+    """A token that changes whenever any post changes, for pages listing
+    many posts."""
+    return get_cache().get_or_set(GENERATION_KEY, _new_version(), None)
+
+
+def bump_post_versions(pks):
+    """Invalidate every cached fragment of the given posts."""
+    now = time.time()
+    versions = {VERSION_KEY.format(pk=pk): _new_version(now) for pk in set(pks)}
+    versions[GENERATION_KEY] = _new_version(now)
+    get_cache().set_many(versions, None)
+
+
+def forget_dashboards(user_ids):
+    """Drop the cached dashboards of the given users, to be rebuilt on their
+    next request."""
+    get_cache().delete_many([DASHBOARD_KEY.format(pk=pk) for pk in set(user_ids)])
+
+
+def _record(outcome):
+    # Counted in this process: updating a shared cache on every read would
+    # cost more round trips than the fragments save.
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def fragment(name, pk, render, version=None):
+    """Return the cached fragment ``name`` of post ``pk``, calling ``render``
+    and storing its result on a miss. Pass the post's ``version`` when it was
+    already read, to save a cache lookup."""
+    cache = get_cache()
+    version = version or post_version(pk)
+    key = FRAGMENT_KEY.format(name=name, pk=pk, version=version)
+    content = cache.get(key)
+    if content is not None:
+        _record("hits")
+        return content
+    _record("misses")
+    content = render()
+    if is_settled(version):
+        cache.set(key, content, FRAGMENT_TIMEOUT)
+    return content
+
+
+def fragment_stats():
+    """Fragment cache hits and misses counted by this process."""
+    with _stats_lock:
+        return {outcome: _stats[outcome] for outcome in ("hits", "misses")}
+
+
+def reset_fragment_stats():
+    with _stats_lock:
+        _stats.clear()
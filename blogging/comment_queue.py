@@ -0,0 +1,181 @@
+"""
+Write-behind queue for comments.
+
+With ``BLOGGING_QUEUE_COMMENTS`` set, the comment views append comments to a
+spool file instead of inserting them one row per request, and
+``manage.py flush_comments`` writes the spooled comments in batches with
+``bulk_create``. Until then each author sees their own pending comments,
+which are kept in the cache.
+"""
+
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .cache import bump_post_versions, get_cache
+from .models import Comment, Post
+from .search import comment_document, get_backend
+
+PENDING_KEY = "blogging:comments:pending:{post}:{author}"
+PENDING_TIMEOUT = 60 * 60 * 24
+
+
+@contextmanager
+def _locked(path):
+    with open(path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _pending_key(post_id, author_id):
+    return PENDING_KEY.format(post=post_id, author=author_id)
+
+
+def _update_pending(key, update):
+    # Called with the spool lock held, so read-modify-writes of one author's
+    # pending list by concurrent requests don't lose records.
+    cache = get_cache()
+    pending = update(cache.get(key, []))
+    if pending:
+        cache.set(key, pending, PENDING_TIMEOUT)
+    else:
+        cache.delete(key)
+
+
+def enqueue(comment):
+    """Append an unsaved comment to the spool and to its author's pending
+    comments. The spool is fsynced, so an accepted comment survives a crash."""
+    record = {
+        "id": uuid4().hex,
+        "post": comment.post_id,
+        "author": comment.author_id,
+        "text": comment.text,
+    }
+    path = settings.BLOGGING_COMMENT_SPOOL
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _locked(f"{path}.lock"):
+        with open(path, "a") as spool:
+            spool.write(json.dumps(record) + "\n")
+            spool.flush()
+            os.fsync(spool.fileno())
+        key = _pending_key(comment.post_id, comment.author_id)
+        _update_pending(key, lambda pending: pending + [record])
+    return record
+
+
+def record_comment(comment):
+    if settings.BLOGGING_QUEUE_COMMENTS:
+        enqueue(comment)
+    else:
+        comment.save()
+
+
+def pending_comments(post_id, author_id):
+    """The comments ``author_id`` has spooled for a post that haven't been
+    written yet, as ``{"id", "post", "author", "text"}`` dicts."""
+    if not settings.BLOGGING_QUEUE_COMMENTS or author_id is None:
+        return []
+    pending = get_cache().get(_pending_key(post_id, author_id), [])
+    if pending:
+        # The flush may have run in a process whose cache this one doesn't
+        # share, so leave out comments that have been written since.
+        written = {
+            queue_id.hex
+            for queue_id in Comment.objects.filter(
+                queue_id__in=[record["id"] for record in pending]
+            ).values_list("queue_id", flat=True)
+        }
+        pending = [record for record in pending if record["id"] not in written]
+    return pending
+
+
+def write_comments(records, batch_size=None):
+    """Insert spooled comments with ``bulk_create``. Comments on posts that
+    have since been deleted are dropped. Since ``bulk_create`` sends no
+    signals, comment counts, the search index and cached fragments are
+    updated here, once per batch."""
+    post_ids = set(
+        Post.objects.filter(pk__in={record["post"] for record in records}).values_list(
+            "pk", flat=True
+        )
+    )
+    author_ids = set(
+        User.objects.filter(
+            pk__in={record["author"] for record in records if record["author"]}
+        ).values_list("pk", flat=True)
+    )
+    comments = [
+        Comment(
+            post_id=record["post"],
+            author_id=record["author"] if record["author"] in author_ids else None,
+            text=record["text"],
+            queue_id=record["id"],
+        )
+        for record in records
+        if record["post"] in post_ids
+    ]
+    if not comments:
+        return []
+    with transaction.atomic():
+        # Comments written by a flush that failed before removing its batch
+        # already exist, and are skipped by their unique queue_id.
+        Comment.objects.bulk_create(comments, batch_size, ignore_conflicts=True)
+        created = list(
+            Comment.objects.filter(queue_id__in=[c.queue_id for c in comments])
+        )
+        Post.objects.filter(pk__in=post_ids).refresh_comment_stats()
+        backend = get_backend()
+        if backend is not None:
+            backend.update(comment_document(comment) for comment in created)
+    bump_post_versions(post_ids)
+    return created
+
+
+def _forget_pending(records):
+    flushed = {}
+    for record in records:
+        key = _pending_key(record["post"], record["author"])
+        flushed.setdefault(key, set()).add(record["id"])
+    with _locked(f"{settings.BLOGGING_COMMENT_SPOOL}.lock"):
+        for key, ids in flushed.items():
+            _update_pending(
+                key,
+                lambda pending: [
+                    record for record in pending if record["id"] not in ids
+                ],
+            )
+
+
+def flush(batch_size=None):
+    """Write every spooled comment to the database and return the number of
+    comments written.
+
+    The spool is renamed aside while holding its lock, so requests carry on
+    appending to a fresh file. A batch left behind by a failed flush is
+    retried by the next one, without writing any comment twice.
+    """
+    path = settings.BLOGGING_COMMENT_SPOOL
+    claimed = f"{path}.processing"
+    if not os.path.exists(os.path.dirname(path)):
+        return 0
+    with _locked(f"{path}.flush"):
+        if not os.path.exists(claimed):
+            with _locked(f"{path}.lock"):
+                if not os.path.exists(path):
+                    return 0
+                os.rename(path, claimed)
+        with open(claimed) as spool:
+            records = [json.loads(line) for line in spool if line.strip()]
+        created = write_comments(records, batch_size) if records else []
+        os.remove(claimed)
+    _forget_pending(records)
+    return len(created)
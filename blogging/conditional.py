@@ -0,0 +1,84 @@
+import hashlib
+
+from django.db.models import prefetch_related_objects
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .cache import post_version, post_versions, posts_generation
+from .comment_queue import pending_comments
+
+
+def make_etag(request, *parts):
+    """Hash ``parts`` together with the URL and the user, since pages differ
+    per user (menus, edit links)."""
+    source = "|".join(
+        str(part) for part in (request.get_full_path(), request.user.pk, *parts)
+    )
+    return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """Answer GET requests with 304 Not Modified when the client's ETag still
+    matches, before any template is rendered."""
+
+    def get_etag(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            response["ETag"] = etag
+        patch_vary_headers(response, ("Cookie",))
+        return response
+
+
+class ConditionalListMixin(ConditionalGetMixin):
+    """ETag for paginated post lists, from the generation token bumped
+    whenever a post, comment or category changes, and the ids and versions
+    of the posts on the requested page.
+
+    The page is fetched once, for the ETag, and reused for rendering. Its
+    prefetches are only run when the page is rendered.
+    """
+
+    def get_etag(self):
+        queryset = self.get_queryset()
+        self._etag_page = super().paginate_queryset(
+            queryset.prefetch_related(None), self.get_paginate_by(queryset)
+        )
+        posts = self._etag_page[2]
+        pks = [post.pk for post in posts]
+        versions = post_versions(pks)
+        # Reused by {% postcache %}, so rendering reads no versions.
+        for post, version in zip(posts, versions):
+            post.cache_version = version
+        return make_etag(self.request, posts_generation(), *pks, *versions)
+
+    def paginate_queryset(self, queryset, page_size):
+        page = getattr(self, "_etag_page", None)
+        if page is None:
+            return super().paginate_queryset(queryset, page_size)
+        prefetch_related_objects(page[2], *queryset._prefetch_related_lookups)
+        return page
+
+
+class ConditionalDetailMixin(ConditionalGetMixin):
+    def get_etag(self):
+        post = self.get_object()
+        post.cache_version = post_version(post.pk)
+        return make_etag(
+            self.request,
+            post.pk,
+            post.cache_version,
+            post.modified_date,
+            post.post_date,
+            post.status,
+            post.comment_count,
+            post.last_comment_at,
+            *(
+                record["id"]
+                for record in pending_comments(post.pk, self.request.user.pk)
+            ),
+        )
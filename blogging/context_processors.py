@@ -0,0 +1,9 @@
+from django.utils.functional import SimpleLazyObject
+
+from .dashboard import get_dashboard
+
+
+def dashboard(request):
+    """The user's post dashboard, for the counts in the page header. Only
+    read from the cache when a template uses it."""
+    return {"dashboard": SimpleLazyObject(lambda: get_dashboard(request.user.pk))}
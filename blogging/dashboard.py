@@ -0,0 +1,106 @@
+"""
+Per-user summaries of posts by status.
+
+A dashboard maps each ``Post.Status`` to the number of the user's posts in
+that state and the ``BLOGGING_DASHBOARD_LATEST`` most recently created ones
+(``{"id", "title", "created_date"}`` dicts). It is built with a few indexed
+queries the first time it's needed, then kept in the cache and updated in
+place as the user's posts are saved, so the page header and the dashboard
+page don't query the posts table. Deleting a post, or changing its author,
+drops the dashboards involved to be rebuilt.
+"""
+
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count
+
+from .cache import DASHBOARD_KEY, FRAGMENT_TIMEOUT, forget_dashboards, get_cache
+from .models import Post
+
+_lock = threading.Lock()
+
+
+def _entry(post):
+    return {"id": post.pk, "title": post.title, "created_date": post.created_date}
+
+
+def _newest_first(entries):
+    entries = sorted(
+        entries, key=lambda entry: (entry["created_date"], entry["id"]), reverse=True
+    )
+    return entries[: settings.BLOGGING_DASHBOARD_LATEST]
+
+
+def build_dashboard(user_id):
+    # From the primary: dashboards are usually rebuilt right after a change
+    # to the posts, which a replica may not show yet.
+    posts = Post.objects.using(DEFAULT_DB_ALIAS).filter(author_id=user_id)
+    counts = dict(
+        posts.order_by()
+        .values("status")
+        .annotate(count=Count("pk"))
+        .values_list("status", "count")
+    )
+    dashboard = {}
+    for status in Post.Status.values:
+        latest = []
+        if counts.get(status):
+            latest = list(
+                posts.filter(status=status)
+                .order_by("-created_date", "-id")
+                .values("id", "title", "created_date")[
+                    : settings.BLOGGING_DASHBOARD_LATEST
+                ]
+            )
+        dashboard[status] = {"count": counts.get(status, 0), "latest": latest}
+    return dashboard
+
+
+def get_dashboard(user_id):
+    key = DASHBOARD_KEY.format(pk=user_id)
+    cache = get_cache()
+    dashboard = cache.get(key)
+    if dashboard is None:
+        dashboard = build_dashboard(user_id)
+        # add() rather than set(), so an update made meanwhile isn't lost.
+        cache.add(key, dashboard, FRAGMENT_TIMEOUT)
+    return dashboard
+
+
+def _remove(dashboard, post, status):
+    """Take a post out of a status, returning False when the dashboard can't
+    be kept up to date because the next older post isn't known."""
+    section = dashboard[status]
+    section["count"] -= 1
+    section["latest"] = [entry for entry in section["latest"] if entry["id"] != post.pk]
+    limit = settings.BLOGGING_DASHBOARD_LATEST
+    return len(section["latest"]) >= min(section["count"], limit)
+
+
+def update_dashboard(post, previous=None):
+    """Apply a saved post to its author's cached dashboard. ``previous`` is
+    the ``(status, author_id)`` stored for an existing post before saving."""
+    previous_status, previous_author = previous or (None, post.author_id)
+    if previous_author != post.author_id:
+        forget_dashboards([previous_author, post.author_id])
+        return
+    key = DASHBOARD_KEY.format(pk=post.author_id)
+    cache = get_cache()
+    # Only serializes this process's updates; with a cache shared between
+    # processes a concurrent update may be lost until the entry expires.
+    with _lock:
+        dashboard = cache.get(key)
+        if dashboard is None:
+            return
+        if previous_status not in (None, post.status):
+            if not _remove(dashboard, post, previous_status):
+                cache.delete(key)
+                return
+        section = dashboard[post.status]
+        if previous_status != post.status:
+            section["count"] += 1
+        entries = [entry for entry in section["latest"] if entry["id"] != post.pk]
+        section["latest"] = _newest_first(entries + [_entry(post)])
+        cache.set(key, dashboard, FRAGMENT_TIMEOUT)
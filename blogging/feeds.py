@@ -0,0 +1,173 @@
+"""
+Atom and RSS feeds of published posts, read in the view and streamed item
+by item.
+
+Feeds hold at most ``BLOGGING_FEED_ITEMS`` posts. The serialized feed is
+cached until the posts generation token or the number and latest date of the
+feed's posts change, and requests carrying a matching ETag get 304 Not
+Modified.
+"""
+
+import datetime
+import hashlib
+import io
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.http import quote_etag
+from django.utils.timezone import utc
+from django.utils.xmlutils import SimplerXMLGenerator
+
+from .cache import get_cache, is_settled, posts_generation
+from .models import Category, Post
+
+FEED_KEY = "blogging:feed:{version}"
+
+
+def as_datetime(date):
+    if date is None:
+        return None
+    return datetime.datetime.combine(date, datetime.time.min, tzinfo=utc)
+
+
+class StreamingFeedMixin:
+    """Serialize the feed as a sequence of chunks, one per item, instead of
+    building the whole document in memory."""
+
+    def __init__(self, *args, updated=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.updated = updated
+
+    def latest_post_date(self):
+        return self.updated or super().latest_post_date()
+
+    def stream(self, items):
+        buffer = io.StringIO()
+        handler = SimplerXMLGenerator(buffer, "utf-8", short_empty_elements=True)
+
+        def flush():
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return chunk.encode("utf-8")
+
+        handler.startDocument()
+        self.start_document(handler)
+        self.add_root_elements(handler)
+        yield flush()
+        for kwargs in items:
+            self.add_item(**kwargs)
+            item = self.items.pop()
+            handler.startElement(self.item_element, self.item_attributes(item))
+            self.add_item_elements(handler, item)
+            handler.endElement(self.item_element)
+            yield flush()
+        self.end_document(handler)
+        yield flush()
+
+
+class StreamingRssFeed(StreamingFeedMixin, Rss201rev2Feed):
+    item_element = "item"
+
+    def start_document(self, handler):
+        handler.startElement("rss", self.rss_attributes())
+        handler.startElement("channel", self.root_attributes())
+
+    def end_document(self, handler):
+        self.endChannelElement(handler)
+        handler.endElement("rss")
+
+
+class StreamingAtomFeed(StreamingFeedMixin, Atom1Feed):
+    item_element = "entry"
+
+    def start_document(self, handler):
+        handler.startElement("feed", self.root_attributes())
+
+    def end_document(self, handler):
+        handler.endElement("feed")
+
+
+FEED_TYPES = {"rss": StreamingRssFeed, "atom": StreamingAtomFeed}
+
+
+def feed_items(request, posts):
+    for post in posts:
+        link = request.build_absolute_uri(reverse("post_detail", args=[post.pk]))
+        yield {
+            "title": post.title,
+            "link": link,
+            "description": post.text,
+            "unique_id": link,
+            "author_name": post.author.username,
+            "pubdate": as_datetime(post.post_date),
+            "updateddate": as_datetime(post.modified_date),
+            "categories": [category.name for category in post.categories.all()],
+        }
+
+
+def cache_chunks(chunks, key):
+    """Pass ``chunks`` through, storing the complete document once the last
+    chunk has been sent."""
+    document = []
+    for chunk in chunks:
+        document.append(chunk)
+        yield chunk
+    get_cache().set(key, b"".join(document), settings.BLOGGING_FEED_TIMEOUT)
+
+
+def post_feed(request, feed_format, username=None, pk=None):
+    feed_type = FEED_TYPES.get(feed_format)
+    if feed_type is None:
+        raise Http404("Unknown feed format.")
+    posts = Post.objects.published()
+    title = "My Django Blog"
+    if username is not None:
+        author = get_object_or_404(User, username=username)
+        posts = posts.filter(author=author)
+        title = f"{title}: posts by {author.username}"
+    if pk is not None:
+        category = get_object_or_404(Category, pk=pk)
+        posts = posts.filter(categories=category)
+        title = f"{title}: {category.name}"
+
+    stats = posts.order_by().aggregate(count=Count("pk"), latest=Max("post_date"))
+    generation = posts_generation()
+    # The cached document and the ETag share one key, so a body is never
+    # sent under the ETag of another.
+    source = f"{request.get_full_path()}|{generation}|{stats}"
+    version = hashlib.md5(source.encode()).hexdigest()
+    etag = quote_etag(version)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+
+    content_type = feed_type.content_type
+    key = FEED_KEY.format(version=version)
+    document = get_cache().get(key)
+    if document is not None:
+        response = HttpResponse(document, content_type=content_type)
+    else:
+        feed = feed_type(
+            title=title,
+            link=request.build_absolute_uri("/"),
+            description="Published posts",
+            feed_url=request.build_absolute_uri(),
+            updated=as_datetime(stats["latest"]),
+        )
+        # Read here rather than while streaming: under ASGI the response is
+        # iterated on the event loop, where the database can't be used.
+        posts = posts.for_list().order_by("-post_date", "-id")
+        posts = list(posts[: settings.BLOGGING_FEED_ITEMS])
+        chunks = feed.stream(feed_items(request, posts))
+        if is_settled(generation):
+            chunks = cache_chunks(chunks, key)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["ETag"] = etag
+    return response
@@ -0,0 +1,402 @@
+import datetime
+import json
+import random
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import Counter
+from http.cookiejar import CookieJar
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+
+from blogging.models import Category, Comment, Post
+from blogging.search import get_backend
+from django_blog.instrumentation import percentile, registry
+from polling.models import Poll
+
+SCENARIOS = {
+    # name: URL name whose instrumentation samples hold the query counts
+    "post_index": "post_index",
+    "post_detail": "post_detail",
+    "post_user": "post_user",
+    "post_query": "post_query",
+    "poll_vote": "poll_detail",
+}
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class SlowClients:
+    """Connections that send a request header line every ``delay`` seconds
+    and never finish, holding on to whatever serves them, like clients on a
+    very slow network."""
+
+    def __init__(self, base_url, count, delay):
+        url = urllib.parse.urlsplit(base_url)
+        self.address = (url.hostname, url.port or 80)
+        self.count, self.delay = count, delay
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def trickle(self):
+        try:
+            with socket.create_connection(self.address) as sock:
+                sock.sendall(f"GET / HTTP/1.1\r\nHost: {self.address[0]}\r\n".encode())
+                while not self.stopped.wait(self.delay):
+                    sock.sendall(b"X-Slow: 1\r\n")
+        except OSError:
+            pass
+
+    def __enter__(self):
+        for _ in range(self.count):
+            thread = threading.Thread(target=self.trickle, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+
+
+class ClientDriver:
+    """Sends requests through the Django test client, in process."""
+
+    def __init__(self):
+        self.client = Client()
+
+    def __call__(self, method, path, data):
+        if method == "POST":
+            return self.client.post(path, data).status_code
+        return self.client.get(path).status_code
+
+
+class HttpDriver:
+    """Sends requests over HTTP to the local WSGI server, keeping cookies and
+    the CSRF token like a browser would."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies)
+        )
+
+    def csrf_token(self, path):
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        self("GET", path, None)
+        return next(c.value for c in self.cookies if c.name == "csrftoken")
+
+    def __call__(self, method, path, data):
+        request = urllib.request.Request(self.base_url + path)
+        if method == "POST":
+            request.add_header("X-CSRFToken", self.csrf_token(path))
+            request.data = urllib.parse.urlencode(data).encode()
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic users, posts, categories, comments and polls, drive the "
+        "main URLs concurrently and write throughput, latency percentiles and "
+        "queries per request to a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=int, default=1000, help="Number of posts.")
+        parser.add_argument("--comments-per-post", type=int, default=3)
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Requests per scenario."
+        )
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--server",
+            action="store_true",
+            help="Drive a local threaded WSGI server over HTTP instead of the test client.",
+        )
+        parser.add_argument(
+            "--url",
+            help=(
+                "Drive an already running server at this base URL, e.g. gunicorn "
+                "with sync or uvicorn workers. Seeds the configured database."
+            ),
+        )
+        parser.add_argument(
+            "--slow-clients",
+            type=int,
+            default=0,
+            help="Connections that trickle their request headers during the run.",
+        )
+        parser.add_argument("--slow-client-delay", type=float, default=1.0)
+        parser.add_argument(
+            "--in-place",
+            action="store_true",
+            help="Seed the configured database instead of a throwaway test database.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--output", default="-", help="Report file, '-' for stdout."
+        )
+
+    def bulk_insert(self, model, objs, batch_size):
+        batch = []
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                with transaction.atomic():
+                    model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+
+    def seed(self, options, rng):
+        scale, batch_size = options["scale"], options["batch_size"]
+        prefix = f"bench{rng.getrandbits(32):08x}"
+        counts = {
+            "users": max(2, scale // 50),
+            "categories": max(1, scale // 200),
+            "posts": scale,
+            "comments": scale * options["comments_per_post"],
+            "polls": max(1, scale // 100),
+        }
+        password = make_password("benchmark")
+        self.bulk_insert(
+            User,
+            (
+                User(username=f"{prefix}u{n}", password=password)
+                for n in range(counts["users"])
+            ),
+            batch_size,
+        )
+        users = list(
+            User.objects.filter(username__startswith=prefix).values_list(
+                "pk", "username"
+            )
+        )
+        Category.objects.bulk_create(
+            Category(name=f"{prefix} category {n}") for n in range(counts["categories"])
+        )
+        categories = list(
+            Category.objects.filter(name__startswith=prefix).values_list(
+                "pk", flat=True
+            )
+        )
+
+        first_day = datetime.date(2015, 1, 1)
+
+        def new_post(n):
+            post = Post(
+                title=f"Benchmark post {n}",
+                text="Lorem ipsum dolor sit amet. " * rng.randint(1, 20),
+                author_id=rng.choice(users)[0],
+                post_date=(
+                    first_day + datetime.timedelta(rng.randrange(3000))
+                    if rng.random() < 0.8
+                    else None
+                ),
+            )
+            # bulk_create() doesn't call Post.save().
+            post.refresh_status()
+            return post
+
+        self.bulk_insert(Post, (new_post(n) for n in range(scale)), batch_size)
+        user_pks = [pk for pk, _ in users]
+        posts = Post.objects.filter(author__in=user_pks)
+        post_pks = list(posts.values_list("pk", flat=True))
+        published = list(posts.published().values_list("pk", flat=True))
+        self.bulk_insert(
+            Category.posts.through,
+            (
+                Category.posts.through(category_id=rng.choice(categories), post_id=pk)
+                for pk in post_pks
+            ),
+            batch_size,
+        )
+        self.bulk_insert(
+            Comment,
+            (
+                Comment(
+                    post_id=rng.choice(post_pks),
+                    author_id=rng.choice(user_pks),
+                    text="Benchmark comment",
+                )
+                for _ in range(counts["comments"])
+            ),
+            batch_size,
+        )
+        Poll.objects.bulk_create(
+            Poll(title=f"{prefix} poll {n}") for n in range(counts["polls"])
+        )
+        polls = list(
+            Poll.objects.filter(title__startswith=prefix).values_list("pk", flat=True)
+        )
+
+        call_command("recount_comments", stdout=self.stderr)
+        backend = get_backend()
+        if backend is not None:
+            backend.rebuild(Post, Comment)
+        return counts, {"users": users, "published": published, "polls": polls}
+
+    def targets(self, scenario, data, rng, count):
+        for _ in range(count):
+            if scenario == "post_index":
+                yield "GET", "/", None
+            elif scenario == "post_detail":
+                yield "GET", f"/posts/{rng.choice(data['published'])}/", None
+            elif scenario == "post_user":
+                yield "GET", f"/posts/{rng.choice(data['users'])[1]}/", None
+            elif scenario == "post_query":
+                username = rng.choice(data["users"])[1]
+                yield "GET", f"/posts/filter/author/{username}/", None
+            elif scenario == "poll_vote":
+                vote = rng.choice(["Yes", "No"])
+                path = f"/polling/polls/{rng.choice(data['polls'])}/"
+                yield "POST", path, {"vote": vote}
+
+    def run_scenario(self, requests, concurrency, make_driver):
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def work(share):
+            driver = make_driver()
+            try:
+                for method, path, data in share:
+                    start = time.perf_counter()
+                    try:
+                        status = driver(method, path, data)
+                    except Exception as error:
+                        status = repr(error)
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed * 1000)
+                        if not isinstance(status, int) or status >= 400:
+                            errors.append(status)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=work, args=(requests[n::concurrency],))
+            for n in range(concurrency)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - start, sorted(latencies), errors
+
+    def benchmark(self, options):
+        rng = random.Random(options["seed"])
+        started = time.perf_counter()
+        counts, data = self.seed(options, rng)
+        self.stderr.write(f"Seeded {counts} in {time.perf_counter() - started:.1f}s")
+
+        server, base_url = None, options["url"]
+        if options["server"] and not base_url:
+            server = ThreadedWSGIServer(("127.0.0.1", 0), QuietHandler)
+            server.set_app(get_wsgi_application())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_port}"
+        if base_url:
+            base_url = base_url.rstrip("/")
+            make_driver = lambda: HttpDriver(base_url)
+        else:
+            make_driver = ClientDriver
+        slow_clients = SlowClients(
+            base_url, options["slow_clients"], options["slow_client_delay"]
+        )
+
+        report = {
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "mode": "server" if base_url else "client",
+            "target": options["url"],
+            "concurrency": options["concurrency"],
+            "slow_clients": options["slow_clients"],
+            "seed": options["seed"],
+            "rows": counts,
+            "scenarios": {},
+        }
+        try:
+            with slow_clients:
+                for scenario, view_name in SCENARIOS.items():
+                    requests = list(
+                        self.targets(scenario, data, rng, options["requests"])
+                    )
+                    registry.clear()
+                    elapsed, latencies, errors = self.run_scenario(
+                        requests, options["concurrency"], make_driver
+                    )
+                    views = registry.report().get(view_name, {})
+                    report["scenarios"][scenario] = {
+                        "requests": len(requests),
+                        "errors": dict(Counter(str(status) for status in errors)),
+                        "seconds": round(elapsed, 3),
+                        "requests_per_second": round(len(requests) / elapsed, 1),
+                        "latency_ms": {
+                            f"p{pct}": round(percentile(latencies, pct), 2)
+                            for pct in (50, 95, 99)
+                        },
+                        "queries_per_request": views.get("queries"),
+                        "db_ms": views.get("db"),
+                    }
+                    self.stderr.write(
+                        f"{scenario}: {report['scenarios'][scenario]['requests_per_second']}"
+                        f" req/s, {len(errors)} errors"
+                    )
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+        return report
+
+    def handle(self, *args, **options):
+        if options["slow_clients"] and not (options["server"] or options["url"]):
+            raise CommandError("Slow clients need --server or --url.")
+        old_config = None
+        # A separate server process reads the configured database.
+        if not (options["in_place"] or options["url"]):
+            old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(
+                INSTRUMENTATION_ENABLED=True,
+                RATELIMIT_ENABLED=False,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver", "127.0.0.1"],
+            ):
+                report = self.benchmark(options)
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+
+        document = json.dumps(report, indent=2)
+        if options["output"] == "-":
+            sys.stdout.write(document + "\n")
+        else:
+            with open(options["output"], "w") as out:
+                out.write(document + "\n")
@@ -0,0 +1,71 @@
+import csv
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from blogging.transfer import MODELS
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream categories, posts, category memberships and comments out as "
+        "NDJSON (one file, or stdout) or CSV (one file per model in a directory)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "output", help="NDJSON file, '-' for stdout, or CSV directory."
+        )
+        parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def rows(self, name, batch_size):
+        model, fields = MODELS[name]
+        return (
+            model.objects.order_by("pk")
+            .values_list(*fields)
+            .iterator(chunk_size=batch_size)
+        )
+
+    def progress(self, name, count):
+        self.stderr.write(f"{name}: {count} exported")
+
+    def export_ndjson(self, output, batch_size):
+        encoder = DjangoJSONEncoder()
+        for name, (_, fields) in MODELS.items():
+            count = 0
+            for row in self.rows(name, batch_size):
+                output.write(encoder.encode({"model": name, **dict(zip(fields, row))}))
+                output.write("\n")
+                count += 1
+                if count % batch_size == 0:
+                    self.progress(name, count)
+            self.progress(name, count)
+
+    def export_csv(self, directory, batch_size):
+        os.makedirs(directory, exist_ok=True)
+        for name, (_, fields) in MODELS.items():
+            count = 0
+            with open(os.path.join(directory, f"{name}.csv"), "w", newline="") as out:
+                writer = csv.writer(out)
+                writer.writerow(fields)
+                for row in self.rows(name, batch_size):
+                    writer.writerow(["" if value is None else value for value in row])
+                    count += 1
+                    if count % batch_size == 0:
+                        self.progress(name, count)
+            self.progress(name, count)
+
+    def handle(self, *args, **options):
+        output, batch_size = options["output"], options["batch_size"]
+        if options["format"] == "csv":
+            if output == "-":
+                raise CommandError("CSV export needs an output directory.")
+            self.export_csv(output, batch_size)
+        elif output == "-":
+            self.export_ndjson(sys.stdout, batch_size)
+        else:
+            with open(output, "w") as out:
+                self.export_ndjson(out, batch_size)
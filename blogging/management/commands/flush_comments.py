@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blogging.comment_queue import flush
+
+
+class Command(BaseCommand):
+    help = "Write comments queued with BLOGGING_QUEUE_COMMENTS to the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of comments inserted per query.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep running, flushing the queue every INTERVAL seconds.",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            written = flush(options["batch_size"])
+            self.stdout.write(f"Wrote {written} comments.")
+            if not interval:
+                break
+            time.sleep(interval)
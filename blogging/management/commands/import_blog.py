@@ -0,0 +1,103 @@
+import csv
+import json
+import os
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from blogging.cache import bump_post_versions, forget_dashboards
+from blogging.models import Comment, Post
+from blogging.search import get_backend
+from blogging.transfer import MODELS, preserve_auto_dates, to_instance
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream-import categories, posts, category memberships and comments "
+        "written by export_blog, in batched bulk inserts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="NDJSON file or CSV directory.")
+        parser.add_argument("--format", choices=["ndjson", "csv"])
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Number of rows buffered per model before a transaction is committed.",
+        )
+
+    def read_ndjson(self, path):
+        with open(path) as lines:
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    name = record.pop("model")
+                except (ValueError, KeyError):
+                    raise CommandError(f"Line {number} is not an exported record.")
+                yield name, record
+
+    def read_csv(self, directory):
+        for name in MODELS:
+            path = os.path.join(directory, f"{name}.csv")
+            if os.path.exists(path):
+                with open(path, newline="") as rows:
+                    for record in csv.DictReader(rows):
+                        yield name, record
+
+    def flush(self, buffers):
+        # Parents are inserted before children, so every transaction is
+        # consistent on its own.
+        touched, authors = set(), set()
+        with transaction.atomic():
+            for name, (model, _) in MODELS.items():
+                objs = buffers[name]
+                if not objs:
+                    continue
+                model.objects.bulk_create(objs)
+                self.counts[name] += len(objs)
+                if model is Post:
+                    touched.update(obj.pk for obj in objs)
+                    authors.update(obj.author_id for obj in objs)
+                elif hasattr(model, "post_id"):
+                    touched.update(obj.post_id for obj in objs)
+                objs.clear()
+        # bulk_create sends no signals, so cached pages are purged here.
+        if touched:
+            bump_post_versions(touched)
+        forget_dashboards(authors)
+        self.stdout.write(
+            ", ".join(f"{name}: {count}" for name, count in self.counts.items())
+        )
+
+    def handle(self, *args, **options):
+        path, batch_size = options["input"], options["batch_size"]
+        fmt = options["format"] or ("csv" if os.path.isdir(path) else "ndjson")
+        records = self.read_csv(path) if fmt == "csv" else self.read_ndjson(path)
+
+        self.counts = {name: 0 for name in MODELS}
+        buffers = {name: [] for name in MODELS}
+        with preserve_auto_dates():
+            for name, record in records:
+                if name not in MODELS:
+                    raise CommandError(f"Unknown model {name!r}.")
+                buffers[name].append(to_instance(name, record))
+                if len(buffers[name]) >= batch_size:
+                    self.flush(buffers)
+            self.flush(buffers)
+
+        # Rows were inserted with explicit ids.
+        models = [model for model, _ in MODELS.values()]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+        call_command("recount_comments", stdout=self.stdout)
+        backend = get_backend()
+        if backend is not None:
+            backend.rebuild(Post, Comment)
+            self.stdout.write("Search index rebuilt.")
+        self.stdout.write(self.style.SUCCESS("Import finished."))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blogging.cache import cache_is_shared
+from blogging.scheduler import publish_scheduled
+
+
+class Command(BaseCommand):
+    help = "Publish scheduled posts whose post_date has come."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep running, publishing due posts every INTERVAL seconds.",
+        )
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            # The web processes would keep serving pages, feeds and
+            # dashboards cached before the posts were published.
+            raise CommandError(
+                "The default cache is local to this process. Configure a "
+                "shared one, or set BLOGGING_PUBLISH_THREAD to publish from "
+                "the web process."
+            )
+        interval = options["interval"]
+        while True:
+            pks = publish_scheduled()
+            self.stdout.write(f"Published {len(pks)} posts.")
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blogging.models import Comment, Post
+from blogging.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of posts and comments."
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if backend is None:
+            raise CommandError("No search backend for this database.")
+        backend.rebuild(Post, Comment)
+        self.stdout.write("Search index rebuilt.")
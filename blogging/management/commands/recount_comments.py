@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from blogging.cache import bump_post_versions
+from blogging.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.comment_count and Post.last_comment_at from comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Number of post ids updated per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_pk = Post.objects.aggregate(last=Max("pk"))["last"] or 0
+        updated = 0
+        for start in range(0, last_pk, batch_size):
+            posts = Post.objects.filter(pk__gt=start, pk__lte=start + batch_size)
+            with transaction.atomic():
+                updated += posts.refresh_comment_stats()
+            # Cached fragments show the counts that were just recomputed.
+            bump_post_versions(posts.values_list("pk", flat=True))
+            self.stdout.write(f"{updated} posts recounted")
+        self.stdout.write(self.style.SUCCESS(f"Recounted {updated} posts."))
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.2 on 2026-10-18 19:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blogging", "0003_auto_20210529_1704"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="comment",
+            name="post",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="comments",
+                to="blogging.post",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "created_time", "id"], name="comment_post_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("post_date__isnull", False)),
+                fields=["-post_date", "-id"],
+                name="post_published_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["-created_date", "-id"], name="post_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["author", "-post_date", "-id"], name="post_author_posted_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["author", "-created_date", "-id"],
+                name="post_author_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["title", "-created_date", "-id"], name="post_title_idx"
+            ),
+        ),
+    ]
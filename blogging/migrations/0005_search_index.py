@@ -0,0 +1,59 @@
+from django.db import migrations
+
+# The index as blogging.search first defined it, copied here so later changes
+# to that module can't alter this migration. Other backends, or a
+# BLOGGING_SEARCH_BACKEND, are set up with `manage.py rebuild_search_index`.
+CREATE_SQL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE blogging_search USING fts5("
+        "title, body, kind UNINDEXED, object_id UNINDEXED, post_id UNINDEXED)",
+        "INSERT INTO blogging_search(blogging_search, rank) "
+        "VALUES ('rank', 'bm25(10.0, 1.0)')",
+        "INSERT INTO blogging_search (rowid, kind, object_id, post_id, title, body) "
+        "SELECT id * 2, 'post', id, id, title, text FROM blogging_post",
+        "INSERT INTO blogging_search (rowid, kind, object_id, post_id, title, body) "
+        "SELECT id * 2 + 1, 'comment', id, post_id, '', text FROM blogging_comment",
+    ],
+    "postgresql": [
+        "CREATE TABLE blogging_search ("
+        "id bigserial PRIMARY KEY, kind varchar(16) NOT NULL, "
+        "object_id bigint NOT NULL, post_id bigint NOT NULL, "
+        "document tsvector NOT NULL)",
+        "CREATE INDEX blogging_search_document ON blogging_search "
+        "USING GIN (document)",
+        "CREATE INDEX blogging_search_object ON blogging_search (kind, object_id)",
+        "CREATE INDEX blogging_search_post ON blogging_search (post_id)",
+        "INSERT INTO blogging_search (kind, object_id, post_id, document) "
+        "SELECT 'post', id, id, "
+        "setweight(to_tsvector('english', title), 'A') || "
+        "setweight(to_tsvector('english', text), 'B') FROM blogging_post",
+        "INSERT INTO blogging_search (kind, object_id, post_id, document) "
+        "SELECT 'comment', id, post_id, "
+        "setweight(to_tsvector('english', ''), 'A') || "
+        "setweight(to_tsvector('english', text), 'B') FROM blogging_comment",
+    ],
+}
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS blogging_search")
+        for sql in CREATE_SQL.get(connection.vendor, []):
+            cursor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS blogging_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blogging", "0004_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
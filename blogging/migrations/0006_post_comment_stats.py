@@ -0,0 +1,51 @@
+# Generated by Django 3.2.2 on 2026-10-18 19:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_comments(apps, schema_editor):
+    Post = apps.get_model("blogging", "Post")
+    Comment = apps.get_model("blogging", "Comment")
+    comments = Comment.objects.filter(post=OuterRef("pk")).order_by()
+    Post.objects.update(
+        comment_count=Coalesce(
+            Subquery(
+                comments.values("post").annotate(count=Count("pk")).values("count")
+            ),
+            0,
+        ),
+        last_comment_at=Subquery(
+            comments.order_by("-created_time").values("created_time")[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blogging", "0005_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="last_comment_at",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("last_comment_at__isnull", False)),
+                fields=["-last_comment_at", "-id"],
+                name="post_activity_idx",
+            ),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
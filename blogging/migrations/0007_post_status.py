@@ -0,0 +1,64 @@
+# Generated by Django 3.2.2 on 2026-10-18 20:18
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def set_status(apps, schema_editor):
+    Post = apps.get_model("blogging", "Post")
+    today = timezone.localdate()
+    Post.objects.filter(post_date__lte=today).update(status="published")
+    Post.objects.filter(post_date__gt=today).update(status="scheduled")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blogging", "0006_post_comment_stats"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="post",
+            name="post_published_idx",
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("draft", "Draft"),
+                    ("scheduled", "Scheduled"),
+                    ("published", "Published"),
+                ],
+                default="draft",
+                editable=False,
+                max_length=16,
+            ),
+        ),
+        migrations.RunPython(set_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("post_date__isnull", False)),
+                fields=["-post_date", "-id"],
+                name="post_dated_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["-post_date", "-id"],
+                name="post_published_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", "scheduled")),
+                fields=["post_date"],
+                name="post_scheduled_idx",
+            ),
+        ),
+    ]
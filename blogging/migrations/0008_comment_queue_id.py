@@ -0,0 +1,18 @@
+# Generated by Django 3.2.2 on 2026-10-18 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blogging", "0007_post_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="queue_id",
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -1,19 +1,193 @@
+import threading
+from contextlib import contextmanager
+
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.db.models.deletion import CASCADE, SET_NULL
 from django.contrib.auth.models import User
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .cache import bump_post_versions, forget_dashboards
+
+# Sent with the ``(pk, post_id)`` of deleted comments, once for each batch of
+# deletions.
+comments_deleted = Signal()
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_comment_deletes():
+    """Collect the comments deleted inside the block, such as those of a
+    deleted post, and send comments_deleted once for all of them on the way
+    out instead of once per comment."""
+    if getattr(_deferred, "comments", None) is not None:
+        yield
+        return
+    _deferred.comments = []
+    try:
+        yield
+    finally:
+        comments, _deferred.comments = _deferred.comments, None
+    if comments:
+        comments_deleted.send(sender=Comment, comments=comments)
+
+
+def defer_comment_delete(comment):
+    """Leave a deleted comment to the enclosing deferred_comment_deletes()
+    block. Returns False when there is none."""
+    comments = getattr(_deferred, "comments", None)
+    if comments is None:
+        return False
+    # Deleted instances lose their pk once the deletion is done.
+    comments.append((comment.pk, comment.post_id))
+    return True
+
+
+class PostQuerySet(models.QuerySet):
+    def published(self):
+        # Matches the condition of the partial index on published posts.
+        return self.filter(status=Post.Status.PUBLISHED)
+
+    def unpublished(self):
+        return self.exclude(status=Post.Status.PUBLISHED)
+
+    def publish_due(self, today=None):
+        """Publish scheduled posts whose post_date has come, invalidating
+        cached pages and feeds once for the whole batch. Returns the ids of
+        the posts published."""
+        today = today or timezone.localdate()
+        due = self.filter(status=Post.Status.SCHEDULED, post_date__lte=today)
+        rows = list(due.values_list("pk", "author"))
+        if not rows:
+            return []
+        pks, authors = zip(*rows)
+        # Another worker may have published them since they were read.
+        published = Post.objects.filter(pk__in=pks, status=Post.Status.SCHEDULED)
+        if not published.update(status=Post.Status.PUBLISHED):
+            return []
+        bump_post_versions(pks)
+        forget_dashboards(authors)
+        return list(pks)
+
+    def delete(self):
+        with deferred_comment_deletes():
+            return super().delete()
+
+    def for_list(self):
+        """Join the author and batch the categories used by blogging/list.html."""
+        return self.select_related("author").prefetch_related("categories")
+
+    def refresh_comment_stats(self):
+        """Recompute comment_count and last_comment_at from the comments table
+        in a single UPDATE."""
+        comments = Comment.objects.filter(post=OuterRef("pk"))
+        return self.update(
+            comment_count=Coalesce(
+                Subquery(
+                    comments.order_by()
+                    .values("post")
+                    .annotate(count=Count("pk"))
+                    .values("count")
+                ),
+                0,
+            ),
+            last_comment_at=Subquery(
+                comments.order_by("-created_time").values("created_time")[:1]
+            ),
+        )
 
 
 class Post(models.Model):
+    class Status(models.TextChoices):
+        DRAFT = "draft"
+        SCHEDULED = "scheduled"
+        PUBLISHED = "published"
+
     title = models.CharField(max_length=128)
     text = models.TextField(blank=True)
     author = models.ForeignKey(User, on_delete=CASCADE)
     created_date = models.DateField(auto_now_add=True)
     modified_date = models.DateField(auto_now=True)
     post_date = models.DateField(blank=True, null=True)
+    # Derived from post_date on save; scheduled posts are published by
+    # PostQuerySet.publish_due() once their date comes.
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.DRAFT, editable=False
+    )
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_comment_at = models.DateField(blank=True, null=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-post_date", "-id"],
+                condition=models.Q(status="published"),
+                name="post_published_idx",
+            ),
+            # Serves post_date queries, which list drafts and scheduled posts too.
+            models.Index(
+                fields=["-post_date", "-id"],
+                condition=models.Q(post_date__isnull=False),
+                name="post_dated_idx",
+            ),
+            models.Index(
+                fields=["post_date"],
+                condition=models.Q(status="scheduled"),
+                name="post_scheduled_idx",
+            ),
+            models.Index(fields=["-created_date", "-id"], name="post_created_idx"),
+            models.Index(
+                fields=["author", "-post_date", "-id"], name="post_author_posted_idx"
+            ),
+            models.Index(
+                fields=["author", "-created_date", "-id"],
+                name="post_author_created_idx",
+            ),
+            models.Index(
+                fields=["title", "-created_date", "-id"], name="post_title_idx"
+            ),
+            models.Index(
+                fields=["-last_comment_at", "-id"],
+                condition=models.Q(last_comment_at__isnull=False),
+                name="post_activity_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def refresh_status(self):
+        # post_date may still hold a datetime or string until it is saved.
+        post_date = self._meta.get_field("post_date").to_python(self.post_date)
+        if post_date is None:
+            self.status = self.Status.DRAFT
+        elif post_date > timezone.localdate():
+            self.status = self.Status.SCHEDULED
+        else:
+            self.status = self.Status.PUBLISHED
+
+    def save(self, *args, update_fields=None, **kwargs):
+        # Read by the post_save handler keeping the author's dashboard. The
+        # stored values, since this instance may predate publish_due().
+        self._previous = None
+        if not self._state.adding:
+            self._previous = (
+                Post.objects.filter(pk=self.pk).values_list("status", "author").first()
+            )
+        self.refresh_status()
+        if update_fields is not None and "post_date" in update_fields:
+            update_fields = {*update_fields, "status"}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with deferred_comment_deletes():
+            return super().delete(*args, **kwargs)
+
 
 class Category(models.Model):
     name = models.CharField(max_length=128)
@@ -27,7 +201,13 @@ class Category(models.Model):
         return self.name
 
     def post_titles(self):
-        return [post.title for post in self.posts.all()]
+        return list(self.posts.values_list("title", flat=True))
+
+
+class CommentQuerySet(models.QuerySet):
+    def delete(self):
+        with deferred_comment_deletes():
+            return super().delete()
 
 
 class Comment(models.Model):
@@ -35,6 +215,17 @@ class Comment(models.Model):
     author = models.ForeignKey(User, null=True, on_delete=SET_NULL)
     text = models.TextField(blank=False)
     created_time = models.DateField(auto_now_add=True)
+    # Id of the comment_queue record a queued comment was written from.
+    queue_id = models.UUIDField(blank=True, null=True, unique=True, editable=False)
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["post", "created_time", "id"], name="comment_post_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.author.username}: {self.text}"
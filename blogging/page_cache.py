@@ -0,0 +1,69 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+
+from .cache import is_settled, post_version, posts_generation
+
+PAGE_KEY = "blogging:page:{path}:{version}"
+
+
+def get_page_cache():
+    return caches[getattr(settings, "BLOGGING_PAGE_CACHE", "pages")]
+
+
+def is_anonymous(request):
+    # Without a session cookie the user can't be logged in, so the session
+    # and user never have to be loaded from the database.
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+    return not request.user.is_authenticated
+
+
+def posts_version(request, **kwargs):
+    return posts_generation()
+
+
+def post_page_version(request, pk, **kwargs):
+    return post_version(pk)
+
+
+def cache_anonymous_page(view, version):
+    """
+    Serve whole pages to logged-out readers from the page cache.
+
+    Pages are keyed by their URL and ``version(request, **kwargs)``, so
+    bumping a post's version token purges exactly the pages that show it.
+    Authenticated users, non-GET requests, non-200 responses, responses that
+    use the CSRF token or set cookies, and pages read from a replica that may
+    not have caught up with the version yet are never cached.
+    """
+
+    @wraps(view)
+    def cached_view(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or not is_anonymous(request):
+            return view(request, *args, **kwargs)
+        cache = get_page_cache()
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        page_version = version(request, **kwargs)
+        key = PAGE_KEY.format(path=path, version=page_version)
+        response = cache.get(key)
+        if response is not None:
+            return get_conditional_response(
+                request, etag=response.get("ETag"), response=response
+            )
+        response = view(request, *args, **kwargs)
+        if hasattr(response, "render") and callable(response.render):
+            response.render()
+        if (
+            response.status_code == 200
+            and not response.cookies
+            and not request.META.get("CSRF_COOKIE_USED")
+            and is_settled(page_version)
+        ):
+            cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    return cached_view
@@ -0,0 +1,174 @@
+from types import SimpleNamespace
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """A single page of a keyset paginated queryset."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Paginate a queryset by seeking past the last row seen instead of using
+    OFFSET, so every page costs the same as the first one.
+
+    ``ordering`` must be a unique ordering of the queryset, which normally
+    means ending it with the primary key, e.g. ``("-post_date", "-id")``.
+    Cursors are signed, opaque tokens holding the ordering values of the row
+    a page starts after (or before, when walking backwards).
+    """
+
+    salt = "blogging.pagination.cursor"
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = int(per_page)
+        self.fields = [
+            (name.lstrip("-"), name.startswith("-")) for name in self.ordering
+        ]
+
+    def _model_field(self, name):
+        opts = self.queryset.model._meta
+        return opts.pk if name == "pk" else opts.get_field(name)
+
+    def _value_to_string(self, obj, name):
+        field = self._model_field(name)
+        if isinstance(obj, dict):
+            # A values() row, keyed by the names used in the ordering.
+            obj = SimpleNamespace(**{field.attname: obj[name]})
+        return field.value_to_string(obj)
+
+    def encode_cursor(self, obj, direction):
+        values = [self._value_to_string(obj, name) for name, _ in self.fields]
+        return signing.dumps([direction, values], salt=self.salt)
+
+    def decode_cursor(self, token):
+        try:
+            direction, values = signing.loads(token, salt=self.salt)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise InvalidCursor(token)
+        if direction not in ("n", "p") or len(values or ()) != len(self.fields):
+            raise InvalidCursor(token)
+        try:
+            return direction, [
+                self._model_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except ValidationError:
+            raise InvalidCursor(token)
+
+    def _seek(self, values, forward):
+        """Build the row-value comparison ``(a, b) > (x, y)`` as a Q object.
+
+        The comparison is ANDed with an inclusive bound on the leading column
+        (``a >= x``) so the database can range-scan an index in order instead
+        of merging the OR branches and sorting them.
+        """
+        condition = Q()
+        for index, (name, descending) in enumerate(self.fields):
+            lookup = "lt" if descending == forward else "gt"
+            term = Q(**{f"{name}__{lookup}": values[index]})
+            for prior, (prior_name, _) in enumerate(self.fields[:index]):
+                term &= Q(**{prior_name: values[prior]})
+            condition |= term
+        name, descending = self.fields[0]
+        lookup = "lte" if descending == forward else "gte"
+        return Q(**{f"{name}__{lookup}": values[0]}) & condition
+
+    def rows_after(self, cursor=None):
+        """The ordered queryset of every row after a forward ``cursor``, for
+        callers that stream rows instead of materializing a page."""
+        queryset = self.queryset
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+            if direction != "n":
+                raise InvalidCursor(cursor)
+            queryset = queryset.filter(self._seek(values, True))
+        return queryset.order_by(*self.ordering)
+
+    def page(self, cursor=None):
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+        else:
+            direction, values = "n", None
+
+        forward = direction == "n"
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        if forward:
+            ordering = self.ordering
+        else:
+            ordering = [
+                name[1:] if name.startswith("-") else f"-{name}"
+                for name in self.ordering
+            ]
+        rows = list(queryset.order_by(*ordering)[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if not forward:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if (forward and has_more) or (not forward and values is not None):
+                next_cursor = self.encode_cursor(rows[-1], "n")
+            if (not forward and has_more) or (forward and values is not None):
+                previous_cursor = self.encode_cursor(rows[0], "p")
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """ListView mixin swapping the default OFFSET paginator for keyset
+    pagination over ``cursor_ordering``."""
+
+    paginate_by = 20
+    cursor_ordering = ("-id",)
+    cursor_kwarg = "cursor"
+
+    def get_cursor_ordering(self):
+        return self.cursor_ordering
+
+    def _cursor_querystring(self, cursor):
+        params = self.request.GET.copy()
+        params[self.cursor_kwarg] = cursor
+        return params.urlencode()
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, self.get_cursor_ordering(), page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404("Invalid page cursor.")
+        if page.has_next():
+            page.next_querystring = self._cursor_querystring(page.next_cursor)
+        if page.has_previous():
+            page.previous_querystring = self._cursor_querystring(page.previous_cursor)
+        return (paginator, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,68 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .models import Post
+
+DEFAULT_ORDERING = ("-created_date", "-id")
+
+
+class QueryError(Exception):
+    pass
+
+
+class Filter:
+    """A field of ``Post`` that may be queried from the URL, the lookups
+    allowed on it and the ordering its results are paginated in."""
+
+    def __init__(self, path, lookups, ordering=DEFAULT_ORDERING):
+        self.path = path
+        self.lookups = lookups
+        self.ordering = ordering
+
+    def model_field(self):
+        model = Post
+        for name in self.path.split("__"):
+            field = model._meta.get_field(name)
+            model = field.related_model or model
+        return field
+
+
+# Every entry is backed by an index (see Post.Meta.indexes and the unique
+# username index on auth_user). The ``contains`` lookups can't use one, but
+# results are walked in DEFAULT_ORDERING with a LIMIT, so the scan stops as
+# soon as a page of matches has been found.
+FILTERS = {
+    "author": Filter("author__username", ("exact",)),
+    "title": Filter("title", ("exact", "startswith", "contains")),
+    "text": Filter("text", ("contains",)),
+    "post_date": Filter(
+        "post_date", ("exact", "gt", "gte", "lt", "lte"), ("-post_date", "-id")
+    ),
+    "created_date": Filter("created_date", ("exact", "gt", "gte", "lt", "lte")),
+}
+COMMANDS = ("filter", "exclude")
+
+
+class PostQuery:
+    """A validated ``/posts/<command>/<parameter>/<value>/`` query."""
+
+    def __init__(self, command, parameter, value):
+        if command not in COMMANDS:
+            raise QueryError(f"Unsupported command {command!r}.")
+        name, _, lookup = parameter.partition("__")
+        lookup = lookup or "exact"
+        spec = FILTERS.get(name)
+        if spec is None or lookup not in spec.lookups:
+            raise QueryError(f"Unsupported query parameter {parameter!r}.")
+        try:
+            self.value = spec.model_field().to_python(value)
+        except ValidationError:
+            raise QueryError(f"Invalid value {value!r} for {parameter!r}.")
+        self.command = command
+        self.condition = Q(**{f"{spec.path}__{lookup}": self.value})
+        self.ordering = spec.ordering if command == "filter" else DEFAULT_ORDERING
+
+    def apply(self, queryset):
+        if self.command == "exclude":
+            return queryset.exclude(self.condition)
+        return queryset.filter(self.condition)
@@ -0,0 +1,55 @@
+import logging
+import threading
+
+from django.db import DatabaseError, connection
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def publish_scheduled():
+    """Publish every scheduled post whose post_date has come. Returns the ids
+    of the posts published."""
+    pks = Post.objects.publish_due()
+    if pks:
+        logger.info("Published %d scheduled posts.", len(pks))
+    return pks
+
+
+class PublishScheduler(threading.Thread):
+    """Daemon thread publishing due posts every ``interval`` seconds, for
+    deployments without a cron job running ``manage.py publish_scheduled``."""
+
+    def __init__(self, interval):
+        super().__init__(name="blogging-publish-scheduler", daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                publish_scheduled()
+            except DatabaseError:
+                logger.exception("Publishing scheduled posts failed.")
+            finally:
+                # Don't hold a connection open between runs.
+                connection.close()
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+
+
+_scheduler = None
+_lock = threading.Lock()
+
+
+def start_scheduler(interval):
+    """Start this process's scheduler thread, once."""
+    global _scheduler
+    with _lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = PublishScheduler(interval)
+            _scheduler.start()
+        return _scheduler
@@ -0,0 +1,187 @@
+"""
+Full-text index over post titles and text and comment text.
+
+Every post and comment is one document in the index, tagged with the post it
+belongs to, and results are ranked per post by their best matching document.
+The backend is picked from the database vendor: FTS5 on SQLite, a tsvector
+column with a GIN index on PostgreSQL. ``BLOGGING_SEARCH_BACKEND`` may name
+another backend class by dotted path.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+PUBLISHED = Post.Status.PUBLISHED
+
+TABLE = "blogging_search"
+WORDS = re.compile(r"\w+")
+
+
+def post_document(post):
+    return ("post", post.pk, post.pk, post.title, post.text)
+
+
+def comment_document(comment):
+    return ("comment", comment.pk, comment.post_id, "", comment.text)
+
+
+class SearchBackend:
+    def create(self, cursor):
+        raise NotImplementedError
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    def insert(self, cursor, documents):
+        raise NotImplementedError
+
+    def search(self, cursor, query, limit, offset):
+        raise NotImplementedError
+
+    def delete(self, cursor, keys):
+        """Delete the documents of ``(kind, object_id)`` pairs."""
+        if keys:
+            cursor.executemany(
+                f"DELETE FROM {TABLE} WHERE kind = %s AND object_id = %s", keys
+            )
+
+    def update(self, documents):
+        """Replace the indexed copies of ``(kind, object_id, post_id, title,
+        body)`` documents."""
+        documents = list(documents)
+        with connection.cursor() as cursor:
+            self.delete(cursor, [document[:2] for document in documents])
+            self.insert(cursor, documents)
+
+    def remove(self, kind, object_ids):
+        with connection.cursor() as cursor:
+            self.delete(cursor, [(kind, object_id) for object_id in object_ids])
+
+    def rebuild(self, post_model, comment_model, batch_size=1000):
+        """Recreate the index from scratch. Takes the models as arguments so
+        migrations can pass their historical versions."""
+        with connection.cursor() as cursor:
+            self.drop(cursor)
+            self.create(cursor)
+            for queryset, kind in (
+                (post_model.objects.values_list("pk", "pk", "title", "text"), "post"),
+                (
+                    comment_model.objects.values_list("pk", "post_id", "text"),
+                    "comment",
+                ),
+            ):
+                batch = []
+                for row in queryset.iterator(chunk_size=batch_size):
+                    if kind == "post":
+                        batch.append(("post", *row))
+                    else:
+                        batch.append(("comment", row[0], row[1], "", row[2]))
+                    if len(batch) >= batch_size:
+                        self.insert(cursor, batch)
+                        batch = []
+                self.insert(cursor, batch)
+
+    def post_ids(self, query, limit, offset=0):
+        """Ids of published posts matching ``query``, best match first."""
+        terms = WORDS.findall(query)
+        if not terms:
+            return []
+        with connection.cursor() as cursor:
+            return [row[0] for row in self.search(cursor, terms, limit, offset)]
+
+
+class SQLiteSearchBackend(SearchBackend):
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            "title, body, kind UNINDEXED, object_id UNINDEXED, post_id UNINDEXED)"
+        )
+        # Rank by bm25 with title matches weighted ten times higher than text.
+        cursor.execute(
+            f"INSERT INTO {TABLE}({TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0)')"
+        )
+
+    @staticmethod
+    def rowid(kind, object_id):
+        # FTS5 can only look rows up quickly by rowid, so derive a unique one
+        # from the document instead of filtering on the UNINDEXED columns.
+        return object_id * 2 + (kind == "comment")
+
+    def delete(self, cursor, keys):
+        if keys:
+            cursor.executemany(
+                f"DELETE FROM {TABLE} WHERE rowid = %s",
+                [(self.rowid(kind, object_id),) for kind, object_id in keys],
+            )
+
+    def insert(self, cursor, documents):
+        if documents:
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (rowid, kind, object_id, post_id, title, body) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                [(self.rowid(doc[0], doc[1]), *doc) for doc in documents],
+            )
+
+    def search(self, cursor, terms, limit, offset):
+        match = " ".join('"{}"'.format(term.replace('"', "")) for term in terms)
+        cursor.execute(
+            f"SELECT s.post_id, MIN(s.rank) AS score FROM {TABLE} s "
+            "JOIN blogging_post p ON p.id = s.post_id "
+            f"WHERE {TABLE} MATCH %s AND p.status = %s "
+            "GROUP BY s.post_id ORDER BY score, s.post_id LIMIT %s OFFSET %s",
+            [match, PUBLISHED, limit, offset],
+        )
+        return cursor.fetchall()
+
+
+class PostgresSearchBackend(SearchBackend):
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE {TABLE} ("
+            "id bigserial PRIMARY KEY, kind varchar(16) NOT NULL, "
+            "object_id bigint NOT NULL, post_id bigint NOT NULL, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(f"CREATE INDEX {TABLE}_document ON {TABLE} USING GIN (document)")
+        cursor.execute(f"CREATE INDEX {TABLE}_object ON {TABLE} (kind, object_id)")
+        cursor.execute(f"CREATE INDEX {TABLE}_post ON {TABLE} (post_id)")
+
+    def insert(self, cursor, documents):
+        if documents:
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (kind, object_id, post_id, document) "
+                "VALUES (%s, %s, %s, "
+                "setweight(to_tsvector('english', %s), 'A') || "
+                "setweight(to_tsvector('english', %s), 'B'))",
+                documents,
+            )
+
+    def search(self, cursor, terms, limit, offset):
+        cursor.execute(
+            "SELECT s.post_id, MAX(ts_rank(s.document, q)) AS score "
+            f"FROM {TABLE} s JOIN blogging_post p ON p.id = s.post_id, "
+            "plainto_tsquery('english', %s) q "
+            "WHERE s.document @@ q AND p.status = %s "
+            "GROUP BY s.post_id ORDER BY score DESC, s.post_id LIMIT %s OFFSET %s",
+            [" ".join(terms), PUBLISHED, limit, offset],
+        )
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_backend(vendor=None):
+    path = getattr(settings, "BLOGGING_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    backend = BACKENDS.get(vendor or connection.vendor)
+    return backend() if backend else None
@@ -0,0 +1,119 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import bump_post_versions, forget_dashboards
+from .dashboard import update_dashboard
+from .models import (
+    Category,
+    Comment,
+    Post,
+    comments_deleted,
+    defer_comment_delete,
+)
+from .search import comment_document, get_backend, post_document
+
+CategoryPosts = Category.posts.through
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    bump_post_versions([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def post_saved_to_dashboard(sender, instance, **kwargs):
+    update_dashboard(instance, getattr(instance, "_previous", None))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted_from_dashboard(sender, instance, **kwargs):
+    # The status held by the deleted instance may be out of date.
+    forget_dashboards([instance.author_id])
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F("comment_count") + 1,
+            last_comment_at=instance.created_time,
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    # Deleting a post or a batch of comments handles them all at once.
+    if not defer_comment_delete(instance):
+        comments_deleted.send(
+            sender=Comment, comments=[(instance.pk, instance.post_id)]
+        )
+
+
+@receiver(comments_deleted)
+def uncount_comments(sender, comments, **kwargs):
+    post_ids = {post_id for _, post_id in comments}
+    Post.objects.filter(pk__in=post_ids).refresh_comment_stats()
+    bump_post_versions(post_ids)
+
+
+@receiver(post_save, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    # Connected after the counters so no fragment is cached with old counts.
+    bump_post_versions([instance.post_id])
+
+
+@receiver(m2m_changed, sender=CategoryPosts)
+def category_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        bump_post_versions([instance.pk])
+    elif action == "pre_clear":
+        bump_post_versions(instance.posts.values_list("pk", flat=True))
+    else:
+        bump_post_versions(pk_set)
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    if instance.pk is not None:
+        bump_post_versions(instance.posts.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields and "username" not in update_fields):
+        return
+    bump_post_versions(instance.post_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    backend = get_backend()
+    if backend is not None:
+        backend.update([post_document(instance)])
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    backend = get_backend()
+    if backend is not None:
+        backend.update([comment_document(instance)])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    backend = get_backend()
+    if backend is not None:
+        backend.remove("post", [instance.pk])
+
+
+@receiver(comments_deleted)
+def unindex_comments(sender, comments, **kwargs):
+    backend = get_backend()
+    if backend is not None:
+        backend.remove("comment", [pk for pk, _ in comments])
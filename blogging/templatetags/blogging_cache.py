@@ -0,0 +1,42 @@
+from django import template
+
+from blogging.cache import fragment
+
+register = template.Library()
+
+
+class PostCacheNode(template.Node):
+    def __init__(self, nodelist, name, post):
+        self.nodelist = nodelist
+        self.name = name
+        self.post = post
+
+    def render(self, context):
+        post = self.post.resolve(context)
+        return fragment(
+            self.name.resolve(context),
+            post.pk,
+            lambda: self.nodelist.render(context),
+            # Set by the conditional views, which read it for the ETag.
+            getattr(post, "cache_version", None),
+        )
+
+
+@register.tag("postcache")
+def do_postcache(parser, token):
+    """
+    Cache the enclosed template fragment per post until the post, its
+    categories or its comments change::
+
+        {% postcache "detail" post %}...{% endpostcache %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires a fragment name and a post."
+        )
+    nodelist = parser.parse(("endpostcache",))
+    parser.delete_first_token()
+    return PostCacheNode(
+        nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2])
+    )
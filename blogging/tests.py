@@ -1,15 +1,74 @@
+import asyncio
 import datetime
+import io
+import json
+import os
+import runpy
+import tempfile
+import time
+import unittest
+from unittest import mock
 
 from django.db.models.query import FlatValuesListIterable
 from django.http.response import Http404
 from django.shortcuts import redirect
 from .models import Post, Category, Comment
+from .api import PostResource
+from . import comment_queue
+from .cache import (
+    bump_post_versions,
+    fragment,
+    fragment_stats,
+    is_settled,
+    post_version,
+    posts_generation,
+    reset_fragment_stats,
+)
+from .dashboard import get_dashboard
+from .pagination import KeysetPaginator
+from .queries import PostQuery
+from .page_cache import get_page_cache
+from .search import get_backend
+from asgiref.sync import async_to_sync
+from django_blog.async_views import async_view
+from django_blog.db import (
+    PIN_COOKIE,
+    PinPrimaryMiddleware,
+    PrimaryReplicaRouter,
+    _state as db_state,
+    check_connection_health,
+    is_pinned,
+    read_from_replica,
+)
+from django_blog.instrumentation import registry
+from django_blog.testing import QueryBudgetMixin, asgi_get
+from .views import (
+    PostDetail,
+    PostPostedList,
+    PostUserList,
+    PostUserNotPublished,
+    PostUserPublishedList,
+)
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase, TransactionTestCase, LiveServerTestCase
 from django.db.transaction import TransactionManagementError
-from django.contrib.auth.models import User
-from django.test import Client
-from django.http import HttpRequest
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import AsyncRequestFactory, Client, RequestFactory
+from django.http import HttpRequest, HttpResponse
 from django.utils.timezone import utc
+from django.conf import settings
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+no_page_cache = override_settings(
+    CACHES={
+        **settings.CACHES,
+        "pages": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+    }
+)
 
 
 class PostTestCase(TestCase):
@@ -353,3 +412,1672 @@ class FrontEndTestCase(TestCase):
             self.assertNotContains(pub_list, f"Post {count} Title")
         for count in range(6, 11):
             self.assertContains(pub_list, f"Post {count} Title")
+
+
+class KeysetPaginationTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        self.author = User.objects.get(pk=1)
+        today = datetime.date(2021, 6, 1)
+        for count in range(1, 46):
+            Post(
+                title=f"Paged {count} Title",
+                text="paged",
+                author=self.author,
+                post_date=today - datetime.timedelta(count // 3),
+            ).save()
+
+    def walk(self, url):
+        seen = []
+        resp = self.client.get(url)
+        while True:
+            seen.extend(post.title for post in resp.context["object_list"])
+            page = resp.context["page_obj"]
+            if not page.has_next():
+                return seen, resp
+            resp = self.client.get(f"{url}?{page.next_querystring}")
+
+    def test_walk_forward_visits_every_post_once(self):
+        seen, last = self.walk("/")
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(len(set(seen)), 45)
+        self.assertTrue(last.context["page_obj"].has_previous())
+
+    def test_walk_backward_returns_previous_page(self):
+        first = self.client.get("/")
+        second = self.client.get(f"/?{first.context['page_obj'].next_querystring}")
+        back = self.client.get(f"/?{second.context['page_obj'].previous_querystring}")
+        self.assertEqual(
+            list(first.context["object_list"]), list(back.context["object_list"])
+        )
+        self.assertFalse(back.context["page_obj"].has_previous())
+
+    def test_pages_ordered_newest_first(self):
+        seen, _ = self.walk("/")
+        posts = {post.title: post for post in Post.objects.all()}
+        keys = [(posts[title].post_date, posts[title].pk) for title in seen]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_page_links_rendered(self):
+        resp = self.client.get("/")
+        self.assertContains(resp, 'class="next"')
+        self.assertNotContains(resp, 'class="previous"')
+
+    def test_invalid_cursor(self):
+        resp = self.client.get("/?cursor=garbage")
+        self.assertEqual(resp.status_code, 404)
+
+
+class ListQueryCountTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        self.author = User.objects.get(pk=1)
+        self.category = Category(name="Queries", description="counted")
+        self.category.save()
+
+    def add_posts(self, count):
+        for number in range(count):
+            post = Post(
+                title=f"Counted {number}",
+                text="counted",
+                author=self.author,
+                post_date=datetime.date(2021, 6, 1),
+            )
+            post.save()
+            self.category.posts.add(post)
+
+    def test_constant_queries_regardless_of_post_count(self):
+        self.add_posts(2)
+        with self.assertNumQueries(2):
+            resp = self.client.get("/")
+        self.assertContains(resp, ">Queries</a></li>", count=2)
+        self.add_posts(15)
+        with self.assertNumQueries(2):
+            resp = self.client.get("/")
+        self.assertContains(resp, ">Queries</a></li>", count=17)
+        self.assertContains(resp, f"Posted by {self.author.username}", count=17)
+
+    def test_user_list_queries(self):
+        self.add_posts(10)
+        with self.assertNumQueries(2):
+            self.client.get(f"/posts/{self.author.username}/")
+
+
+class PostDetailQueryTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        self.author = User.objects.get(pk=1)
+        self.author2 = User.objects.get(pk=2)
+        self.post = Post(
+            title="Busy post",
+            text="lots of comments",
+            author=self.author,
+            post_date=datetime.date(2021, 6, 1),
+        )
+        self.post.save()
+        category = Category(name="Busy", description="busy")
+        category.save()
+        category.posts.add(self.post)
+
+    def add_comments(self, count):
+        for number in range(count):
+            author = self.author if number % 2 else self.author2
+            Comment(post=self.post, author=author, text=f"comment {number}.").save()
+
+    def test_constant_queries_regardless_of_comment_count(self):
+        self.add_comments(3)
+        with self.assertNumQueries(3):
+            resp = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertContains(resp, "comment 2.")
+        self.add_comments(30)
+        with self.assertNumQueries(3):
+            resp = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertContains(resp, ">Busy</a></li>")
+
+    def test_load_more_comments(self):
+        self.add_comments(120)
+        resp = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertContains(resp, "comment 0.")
+        self.assertNotContains(resp, "comment 50.")
+        self.assertContains(resp, "Load more comments")
+        seen = [comment.text for comment in resp.context["comments"]]
+        while resp.context["comments"].has_next():
+            resp = self.client.get(
+                f"/posts/{self.post.pk}/",
+                {"comments": resp.context["comments"].next_cursor},
+            )
+            seen.extend(comment.text for comment in resp.context["comments"])
+        self.assertEqual(seen, [f"comment {number}." for number in range(120)])
+        self.assertNotContains(resp, "Load more comments")
+
+    def test_missing_post(self):
+        resp = self.client.get("/posts/9999/")
+        self.assertEqual(resp.status_code, 404)
+
+
+@no_page_cache
+class FragmentCacheTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        cache.clear()
+        reset_fragment_stats()
+        self.author = User.objects.get(pk=1)
+        self.post = Post(
+            title="Cached post",
+            text="original text",
+            author=self.author,
+            post_date=datetime.date(2021, 6, 1),
+        )
+        self.post.save()
+        self.category = Category(name="Cached", description="cached")
+        self.category.save()
+
+    def test_fragment_hit_after_first_render(self):
+        self.client.get(f"/posts/{self.post.pk}/")
+        self.assertEqual(fragment_stats(), {"hits": 0, "misses": 1})
+        resp = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertEqual(fragment_stats(), {"hits": 1, "misses": 1})
+        self.assertContains(resp, "original text")
+
+    def test_invalidated_on_save(self):
+        self.client.get("/")
+        self.post.text = "updated text"
+        self.post.save()
+        self.assertContains(self.client.get("/"), "updated text")
+
+    def test_invalidated_on_edit_post(self):
+        self.author.set_password("12345")
+        self.author.save()
+        self.client.login(username="admin", password="12345")
+        self.client.get(f"/posts/{self.post.pk}/")
+        data = {
+            "author": self.author.pk,
+            "post_date": "2021-06-01",
+            "title": "Cached post",
+            "text": "edited text",
+        }
+        resp = self.client.post(f"/posts/{self.post.pk}/edit/", data, follow=True)
+        self.assertContains(resp, "edited text")
+
+    def test_invalidated_on_category_membership(self):
+        self.client.get(f"/posts/{self.post.pk}/")
+        self.category.posts.add(self.post)
+        resp = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertContains(resp, ">Cached</a></li>")
+        self.category.name = "Renamed"
+        self.category.save()
+        resp = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertContains(resp, ">Renamed</a></li>")
+        self.post.categories.remove(self.category)
+        resp = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertNotContains(resp, ">Renamed</a></li>")
+
+    def test_invalidated_on_comment(self):
+        version = post_version(self.post.pk)
+        Comment(post=self.post, author=self.author, text="new").save()
+        self.assertNotEqual(version, post_version(self.post.pk))
+
+    def test_cached_list_reads_each_version_once(self):
+        shared = override_settings(
+            CACHES={
+                **settings.CACHES,
+                "default": settings.DEFAULT_CACHE_BACKENDS["database"],
+            }
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+        call_command("createcachetable", verbosity=0)
+        for count in range(19):
+            Post.objects.create(
+                title=f"Listed {count}",
+                author=self.author,
+                post_date=datetime.date(2021, 6, 1),
+            )
+        url = f"/posts/{self.author.username}/"
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url)
+        self.assertContains(resp, "Listed 18")
+        cache_queries = [q["sql"] for q in queries if "django_blog_cache" in q["sql"]]
+        # The generation, the page's versions, then one read per fragment.
+        self.assertEqual(len(cache_queries), 2 + 20)
+        self.assertTrue(all(sql.startswith("SELECT") for sql in cache_queries))
+        self.assertEqual(fragment_stats(), {"hits": 20, "misses": 20})
+
+    def test_stats_staff_only(self):
+        resp = self.client.get("/cache/stats/")
+        self.assertEqual(resp.status_code, 302)
+        self.author.set_password("12345")
+        self.author.save()
+        self.client.login(username="admin", password="12345")
+        resp = self.client.get("/cache/stats/")
+        self.assertEqual(resp.json(), fragment_stats())
+
+
+class PostQueryTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        self.author = User.objects.get(pk=1)
+        self.author2 = User.objects.get(pk=2)
+        for count in range(1, 31):
+            Post(
+                title=f"Query {count} Title",
+                text="queried",
+                author=self.author if count % 2 else self.author2,
+                post_date=datetime.date(2021, 6, 1) - datetime.timedelta(count),
+            ).save()
+
+    def test_rejects_unlisted_commands(self):
+        for url in (
+            "/posts/delete/title__contains/1/",
+            "/posts/get/title/Query/",
+            "/posts/none/title/Query/",
+        ):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_rejects_unlisted_parameters(self):
+        for url in (
+            "/posts/filter/author__password__startswith/pbkdf2/",
+            "/posts/filter/text__regex/foo/",
+            "/posts/filter/modified_date/2021-01-01/",
+        ):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_rejects_invalid_values(self):
+        resp = self.client.get("/posts/filter/post_date__gt/notadate/")
+        self.assertEqual(resp.status_code, 404)
+
+    def test_author_filter(self):
+        resp = self.client.get(f"/posts/filter/author/{self.author2.username}/")
+        self.assertContains(resp, "Query 2 Title")
+        self.assertNotContains(resp, "Query 1 Title")
+
+    def test_date_range_paginated(self):
+        url = "/posts/filter/post_date__lte/2021-05-30/"
+        resp = self.client.get(url)
+        self.assertEqual(len(resp.context["object_list"]), 20)
+        dates = [post.post_date for post in resp.context["object_list"]]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+        page = resp.context["page_obj"]
+        resp = self.client.get(f"{url}?{page.next_querystring}")
+        self.assertEqual(len(resp.context["object_list"]), 9)
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "Checks SQLite query plans.")
+class QueryPlanTestCase(TestCase):
+    def plan(self, queryset, ordering, cursor_values=None, per_page=20):
+        paginator = KeysetPaginator(queryset, ordering, per_page)
+        if cursor_values is not None:
+            queryset = queryset.filter(paginator._seek(cursor_values, True))
+        return queryset.order_by(*ordering)[: per_page + 1].explain()
+
+    def assertUsesIndex(self, plan, index):
+        self.assertIn(f"USING INDEX {index}", plan)
+        # Walking an index in order is fine, reading a whole table is not.
+        self.assertNotRegex(plan, r"(?m)SCAN blogging_\w+\s*$")
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_front_page(self):
+        ordering = PostPostedList.cursor_ordering
+        queryset = Post.objects.published()
+        self.assertUsesIndex(self.plan(queryset, ordering), "post_published_idx")
+        self.assertUsesIndex(
+            self.plan(queryset, ordering, [datetime.date(2021, 6, 1), 10]),
+            "post_published_idx",
+        )
+
+    def test_user_published(self):
+        queryset = Post.objects.filter(author__pk=1).published()
+        plan = self.plan(queryset, PostUserPublishedList.cursor_ordering)
+        self.assertUsesIndex(plan, "post_author_posted_idx")
+
+    def test_user_unpublished(self):
+        queryset = Post.objects.filter(author__pk=1).unpublished()
+        plan = self.plan(queryset, PostUserNotPublished.cursor_ordering)
+        self.assertUsesIndex(plan, "post_author_created_idx")
+
+    def test_user_posts(self):
+        queryset = Post.objects.filter(author__username="admin")
+        plan = self.plan(queryset, PostUserList.cursor_ordering)
+        self.assertUsesIndex(plan, "post_author_created_idx")
+
+    def test_post_queries(self):
+        for parameter, value, index in (
+            ("title", "Title", "post_title_idx"),
+            ("created_date__gte", "2021-01-01", "post_created_idx"),
+            ("post_date__lt", "2021-01-01", "post_dated_idx"),
+        ):
+            query = PostQuery("filter", parameter, value)
+            plan = self.plan(query.apply(Post.objects.all()), query.ordering)
+            self.assertUsesIndex(plan, index)
+
+    def test_comments(self):
+        plan = self.plan(
+            Comment.objects.filter(post_id=1), ("created_time", "id"), per_page=50
+        )
+        self.assertUsesIndex(plan, "comment_post_created_idx")
+
+
+@unittest.skipUnless(get_backend() is not None, "No search backend.")
+class SearchTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        self.author = User.objects.get(pk=1)
+        self.published = Post(
+            title="Caching strategies",
+            text="How to keep pages fast.",
+            author=self.author,
+            post_date=datetime.date(2021, 6, 1),
+        )
+        self.published.save()
+        self.other = Post(
+            title="Gardening",
+            text="Tomatoes need caching of water.",
+            author=self.author,
+            post_date=datetime.date(2021, 6, 2),
+        )
+        self.other.save()
+        self.draft = Post(title="Caching draft", text="unpublished", author=self.author)
+        self.draft.save()
+
+    def test_ranked_results(self):
+        resp = self.client.get("/search/", {"q": "caching"})
+        titles = [post.title for post in resp.context["object_list"]]
+        self.assertEqual(titles, ["Caching strategies", "Gardening"])
+        self.assertContains(resp, 'Search results for "caching"')
+
+    def test_comment_matches(self):
+        Comment(post=self.other, author=self.author, text="Try mulching.").save()
+        resp = self.client.get("/search/", {"q": "mulching"})
+        self.assertEqual(list(resp.context["object_list"]), [self.other])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.published.text = "Now about invalidation."
+        self.published.save()
+        resp = self.client.get("/search/", {"q": "invalidation"})
+        self.assertEqual(list(resp.context["object_list"]), [self.published])
+        self.published.delete()
+        resp = self.client.get("/search/", {"q": "invalidation"})
+        self.assertEqual(list(resp.context["object_list"]), [])
+
+    def test_operators_are_plain_words(self):
+        resp = self.client.get("/search/", {"q": 'caching" OR NEAR(*'})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_paginated(self):
+        for count in range(25):
+            Post(
+                title=f"Indexed {count}",
+                text="paged search",
+                author=self.author,
+                post_date=datetime.date(2021, 6, 1),
+            ).save()
+        resp = self.client.get("/search/", {"q": "paged"})
+        self.assertEqual(len(resp.context["object_list"]), 20)
+        page = resp.context["page_obj"]
+        resp = self.client.get(f"/search/?{page.next_querystring}")
+        self.assertEqual(len(resp.context["object_list"]), 5)
+        self.assertContains(resp, 'class="previous"')
+
+
+class SearchMigrationTestCase(TransactionTestCase):
+    def test_backfills_existing_posts_and_comments(self):
+        author = User.objects.create_user(username="migrated")
+        post = Post.objects.create(
+            title="Backfilled",
+            text="indexed by the migration",
+            author=author,
+            post_date=datetime.date(2021, 1, 1),
+        )
+        Comment.objects.create(post=post, author=author, text="remarkable")
+        call_command("migrate", "blogging", "0004", verbosity=0)
+        call_command("migrate", "blogging", verbosity=0)
+        backend = get_backend()
+        self.assertEqual(backend.post_ids("migration", 10), [post.pk])
+        self.assertEqual(backend.post_ids("remarkable", 10), [post.pk])
+
+
+class CommentStatsTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        self.author = User.objects.get(pk=1)
+        self.author.set_password("12345")
+        self.author.save()
+        self.posts = []
+        for count in range(1, 4):
+            post = Post(
+                title=f"Discussed {count}",
+                text="talk",
+                author=self.author,
+                post_date=datetime.date(2021, 6, count),
+            )
+            post.save()
+            self.posts.append(post)
+
+    def test_counted_through_views(self):
+        self.client.login(username="admin", password="12345")
+        post = self.posts[0]
+        self.client.post(f"/posts/{post.pk}/", {"post": post.pk, "text": "one"})
+        self.client.post(
+            f"/posts/{post.pk}/comments/",
+            {"post": post.pk, "author": self.author.pk, "text": "two"},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+        self.assertEqual(post.last_comment_at, datetime.date.today())
+        self.assertContains(self.client.get("/"), "2 comments, last on")
+
+    def test_delete_recounts(self):
+        post = self.posts[1]
+        first = Comment(post=post, author=self.author, text="first")
+        first.save()
+        Comment(post=post, author=self.author, text="second").save()
+        first.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        post.comments.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertIsNone(post.last_comment_at)
+
+    def test_deleting_post_handles_comments_once(self):
+        def delete_with_comments(post, count):
+            for number in range(count):
+                Comment(post=post, author=self.author, text=f"reply {number}").save()
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+            return len(queries)
+
+        self.assertEqual(
+            delete_with_comments(self.posts[0], 1),
+            delete_with_comments(self.posts[1], 5),
+        )
+        self.assertFalse(Comment.objects.filter(post__in=self.posts[:2]).exists())
+
+    def test_deleting_comments_refreshes_post_once(self):
+        post = self.posts[0]
+        for number in range(3):
+            Comment(post=post, author=self.author, text=f"reply {number}").save()
+        version = post_version(post.pk)
+        with CaptureQueriesContext(connection) as queries:
+            post.comments.all().delete()
+        updates = [q for q in queries if q["sql"].startswith('UPDATE "blogging_post"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotEqual(post_version(post.pk), version)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+    def test_recount_command(self):
+        for post in self.posts:
+            Comment(post=post, author=self.author, text="counted").save()
+        Post.objects.update(comment_count=0, last_comment_at=None)
+        version = post_version(self.posts[0].pk)
+        call_command("recount_comments", batch_size=2, stdout=io.StringIO())
+        self.assertNotEqual(post_version(self.posts[0].pk), version)
+        for post in Post.objects.filter(pk__in=[post.pk for post in self.posts]):
+            self.assertEqual(post.comment_count, 1)
+            self.assertIsNotNone(post.last_comment_at)
+
+    def test_activity_list(self):
+        Comment(post=self.posts[0], author=self.author, text="old").save()
+        Post.objects.filter(pk=self.posts[0].pk).update(
+            last_comment_at=datetime.date(2021, 1, 1)
+        )
+        Comment(post=self.posts[2], author=self.author, text="new").save()
+        with self.assertNumQueries(2):
+            resp = self.client.get("/active/")
+        self.assertEqual(
+            list(resp.context["object_list"]), [self.posts[2], self.posts[0]]
+        )
+        self.assertContains(resp, "Recently discussed")
+
+
+class ScheduledPublishingTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        self.author = User.objects.get(pk=1)
+        self.today = datetime.date.today()
+        self.scheduled = Post(
+            title="Coming soon",
+            text="later",
+            author=self.author,
+            post_date=self.today + datetime.timedelta(days=2),
+        )
+        self.scheduled.save()
+
+    def test_status_derived_from_post_date(self):
+        draft = Post(title="Draft", author=self.author)
+        draft.save()
+        self.assertEqual(draft.status, Post.Status.DRAFT)
+        self.assertEqual(self.scheduled.status, Post.Status.SCHEDULED)
+        self.scheduled.post_date = datetime.datetime(2021, 6, 1, 12, tzinfo=utc)
+        self.scheduled.save(update_fields=["post_date"])
+        self.scheduled.refresh_from_db()
+        self.assertEqual(self.scheduled.status, Post.Status.PUBLISHED)
+
+    def test_scheduled_posts_hidden(self):
+        self.assertNotContains(self.client.get("/"), "Coming soon")
+        self.assertNotIn(b"Coming soon", b"".join(self.client.get("/feeds/rss/")))
+        resp = self.client.get(f"/posts/{self.scheduled.pk}/")
+        self.assertRedirects(resp, "/login/", fetch_redirect_response=False)
+
+    def test_publish_due(self):
+        self.assertEqual(Post.objects.publish_due(), [])
+        self.assertNotContains(self.client.get("/"), "Coming soon")
+        generation = posts_generation()
+        later = self.today + datetime.timedelta(days=2)
+        with self.assertNumQueries(2):
+            self.assertEqual(Post.objects.publish_due(later), [self.scheduled.pk])
+        self.assertNotEqual(posts_generation(), generation)
+        self.scheduled.refresh_from_db()
+        self.assertEqual(self.scheduled.status, Post.Status.PUBLISHED)
+        generation = posts_generation()
+        self.assertEqual(Post.objects.publish_due(later), [])
+        self.assertEqual(posts_generation(), generation)
+
+    def test_only_gunicorn_workers_start_publish_thread(self):
+        config = runpy.run_path(os.path.join(settings.BASE_DIR, "gunicorn.conf.py"))
+        with mock.patch("blogging.scheduler.start_scheduler") as start:
+            with override_settings(BLOGGING_PUBLISH_THREAD=False):
+                config["post_worker_init"](mock.Mock())
+            start.assert_not_called()
+            with override_settings(BLOGGING_PUBLISH_THREAD=True):
+                config["post_worker_init"](mock.Mock())
+        start.assert_called_once_with(settings.BLOGGING_PUBLISH_INTERVAL)
+
+    def test_publish_scheduled_command(self):
+        with self.assertRaisesMessage(CommandError, "local to this process"):
+            call_command("publish_scheduled", stdout=io.StringIO())
+        shared = override_settings(
+            CACHES={
+                **settings.CACHES,
+                "default": settings.DEFAULT_CACHE_BACKENDS["database"],
+            }
+        )
+        shared.enable()
+        self.addCleanup(shared.disable)
+        call_command("createcachetable", verbosity=0)
+        Post.objects.filter(pk=self.scheduled.pk).update(post_date=self.today)
+        self.assertNotContains(self.client.get("/"), "Coming soon")
+        out = io.StringIO()
+        call_command("publish_scheduled", stdout=out)
+        self.assertIn("Published 1 posts.", out.getvalue())
+        self.assertContains(self.client.get("/"), "Coming soon")
+
+
+class CommentQueueTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        cache.clear()
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        queued = override_settings(
+            BLOGGING_QUEUE_COMMENTS=True,
+            BLOGGING_COMMENT_SPOOL=os.path.join(spool.name, "comments.jsonl"),
+        )
+        queued.enable()
+        self.addCleanup(queued.disable)
+        self.author = User.objects.get(pk=1)
+        self.author.set_password("12345")
+        self.author.save()
+        self.post = Post(
+            title="Busy post",
+            text="talk",
+            author=self.author,
+            post_date=datetime.date(2021, 6, 1),
+        )
+        self.post.save()
+        self.client.login(username="admin", password="12345")
+
+    def comment(self, text, post=None):
+        post = post or self.post
+        self.client.post(f"/posts/{post.pk}/", {"post": post.pk, "text": text})
+
+    def test_pending_until_flushed(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.comment("queued comment")
+        self.assertFalse(
+            [query for query in queries if query["sql"].startswith("INSERT")]
+        )
+        self.assertFalse(Comment.objects.exists())
+        resp = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertContains(resp, "queued comment")
+        self.assertContains(resp, "awaiting publication")
+        self.assertNotContains(
+            Client().get(f"/posts/{self.post.pk}/"), "queued comment"
+        )
+        etag = resp["ETag"]
+        self.comment("another one")
+        resp = self.client.get(f"/posts/{self.post.pk}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(resp, "another one")
+
+        out = io.StringIO()
+        call_command("flush_comments", stdout=out)
+        self.assertIn("Wrote 2 comments.", out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        self.assertEqual(
+            list(self.post.comments.values_list("text", "author")),
+            [("queued comment", self.author.pk), ("another one", self.author.pk)],
+        )
+        resp = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertContains(resp, "queued comment")
+        self.assertNotContains(resp, "awaiting publication")
+        call_command("flush_comments", stdout=out)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_flushed_elsewhere(self):
+        self.comment("written by another process")
+        key = f"blogging:comments:pending:{self.post.pk}:{self.author.pk}"
+        stale = cache.get(key)
+        comment_queue.flush()
+        # As if the flush had run against a cache this process doesn't share.
+        cache.set(key, stale)
+        resp = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertContains(resp, "written by another process", count=1)
+        self.assertNotContains(resp, "awaiting publication")
+
+    def test_failed_flush_retried_once(self):
+        self.comment("retried")
+        path = settings.BLOGGING_COMMENT_SPOOL
+        with mock.patch("os.remove", side_effect=OSError):
+            with self.assertRaises(OSError):
+                comment_queue.flush()
+        self.assertTrue(os.path.exists(f"{path}.processing"))
+        self.comment("next")
+        comment_queue.flush()
+        self.assertEqual(
+            list(self.post.comments.values_list("text", flat=True)), ["retried"]
+        )
+        comment_queue.flush()
+        self.assertEqual(self.post.comments.count(), 2)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+
+    def test_flush_in_batches(self):
+        other = Post(title="Other", author=self.author, post_date=self.post.post_date)
+        other.save()
+        for count in range(5):
+            self.comment(f"burst {count}")
+        self.comment("elsewhere", other)
+        doomed = Post(title="Doomed", author=self.author, post_date=other.post_date)
+        doomed.save()
+        self.comment("lost", doomed)
+        doomed.delete()
+        self.assertEqual(comment_queue.flush(batch_size=2), 6)
+        self.assertEqual(
+            dict(Post.objects.values_list("title", "comment_count")),
+            {"Busy post": 5, "Other": 1},
+        )
+        backend = get_backend()
+        if backend is not None:
+            self.assertEqual(backend.post_ids("elsewhere", 10), [other.pk])
+
+
+@override_settings(RATELIMITS={"comment": (2, 60), "register": (1, 3600)})
+class RateLimitTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.get(pk=1)
+        self.author.set_password("12345")
+        self.author.save()
+        self.post = Post(
+            title="Popular",
+            text="talk",
+            author=self.author,
+            post_date=datetime.date(2021, 6, 1),
+        )
+        self.post.save()
+
+    def comment(self, client, text="spam"):
+        return client.post(
+            f"/posts/{self.post.pk}/", {"post": self.post.pk, "text": text}
+        )
+
+    def test_comments_limited_per_user(self):
+        self.client.login(username="admin", password="12345")
+        for _ in range(2):
+            self.assertEqual(self.comment(self.client).status_code, 302)
+        resp = self.comment(self.client)
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp["Retry-After"], "30")
+        resp = self.client.post(
+            f"/posts/{self.post.pk}/comments/",
+            {"post": self.post.pk, "author": self.author.pk, "text": "more"},
+        )
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(self.post.comments.count(), 2)
+        self.assertEqual(self.client.get(f"/posts/{self.post.pk}/").status_code, 200)
+
+        other = User.objects.get(pk=2)
+        other.set_password("12345")
+        other.save()
+        client = Client()
+        client.login(username=other.username, password="12345")
+        self.assertEqual(self.comment(client).status_code, 302)
+
+    def test_refill(self):
+        client = Client()
+        client.login(username="admin", password="12345")
+        with mock.patch("django_blog.ratelimit.time.time", return_value=1000.0):
+            self.comment(client)
+            self.comment(client)
+            self.assertEqual(self.comment(client).status_code, 429)
+        with mock.patch("django_blog.ratelimit.time.time", return_value=1030.0):
+            self.assertEqual(self.comment(client).status_code, 302)
+            self.assertEqual(self.comment(client).status_code, 429)
+
+    def test_anonymous_limited_by_address_without_queries(self):
+        data = {"username": "bot", "password1": "x", "password2": "y"}
+        self.client.post("/register/", data)
+        with self.assertNumQueries(0):
+            resp = self.client.post("/register/", data)
+        self.assertEqual(resp.status_code, 429)
+        resp = self.client.post("/register/", data, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(resp.status_code, 200)
+
+    def test_anonymous_comments_redirected_without_tokens(self):
+        for _ in range(3):
+            self.assertRedirects(
+                self.comment(self.client), "/login/", fetch_redirect_response=False
+            )
+        self.client.login(username="admin", password="12345")
+        self.assertEqual(self.comment(self.client).status_code, 302)
+        self.assertEqual(self.post.comments.count(), 1)
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_disabled(self):
+        client = Client()
+        client.login(username="admin", password="12345")
+        for _ in range(3):
+            self.assertEqual(self.comment(client).status_code, 302)
+
+
+@override_settings(BLOGGING_DASHBOARD_LATEST=2)
+class DashboardTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.get(pk=1)
+        self.author.set_password("12345")
+        self.author.save()
+        self.posts = []
+        for count in range(1, 4):
+            post = Post(
+                title=f"Mine {count}",
+                author=self.author,
+                post_date=datetime.date(2021, 6, count),
+            )
+            post.save()
+            self.posts.append(post)
+        Post(title="Draft", author=self.author).save()
+        self.client.login(username="admin", password="12345")
+
+    def summary(self):
+        with self.assertNumQueries(0):
+            dashboard = get_dashboard(self.author.pk)
+        return {
+            status: (section["count"], [entry["title"] for entry in section["latest"]])
+            for status, section in dashboard.items()
+        }
+
+    def test_header_and_dashboard(self):
+        resp = self.client.get("/")
+        self.assertContains(resp, "Unpublished Posts (1)")
+        self.assertContains(resp, "Published Posts (3)")
+        self.assertContains(resp, f'href="/posts/{self.author.username}/unpublished/"')
+        with self.assertNumQueries(2):
+            resp = self.client.get("/dashboard/")
+        self.assertContains(resp, "Published (3)")
+        self.assertContains(resp, "Mine 3")
+        self.assertNotContains(resp, "Mine 1")
+        self.assertContains(resp, "Scheduled (0)")
+
+    def test_kept_up_to_date(self):
+        get_dashboard(self.author.pk)
+        self.client.post(
+            "/posts/new_post/",
+            {"title": "Later", "author": self.author.pk, "post_date": "2999-01-01"},
+        )
+        self.client.post(
+            f"/posts/{self.posts[0].pk}/edit/",
+            {"title": "Mine 1 again", "author": self.author.pk, "post_date": ""},
+        )
+        self.assertEqual(
+            self.summary(),
+            {
+                "draft": (2, ["Draft", "Mine 1 again"]),
+                "scheduled": (1, ["Later"]),
+                "published": (2, ["Mine 3", "Mine 2"]),
+            },
+        )
+        self.posts[2].delete()
+        self.assertIsNone(cache.get(f"blogging:dashboard:{self.author.pk}"))
+        self.assertEqual(get_dashboard(self.author.pk)["published"]["count"], 1)
+        Post.objects.publish_due(datetime.date(2999, 1, 1))
+        self.assertEqual(get_dashboard(self.author.pk)["published"]["count"], 2)
+
+    def test_saving_instance_loaded_before_publish(self):
+        later = Post.objects.create(
+            title="Later", author=self.author, post_date=datetime.date(2999, 1, 1)
+        )
+        stale = Post.objects.get(pk=later.pk)
+        Post.objects.publish_due(datetime.date(2999, 1, 1))
+        get_dashboard(self.author.pk)
+        stale.title = "Later again"
+        stale.save()
+        self.assertEqual(
+            {
+                status: section["count"]
+                for status, section in get_dashboard(self.author.pk).items()
+            },
+            {"draft": 1, "scheduled": 1, "published": 3},
+        )
+
+    def test_author_change_forgets_both_dashboards(self):
+        other = User.objects.create_user("other")
+        get_dashboard(self.author.pk)
+        get_dashboard(other.pk)
+        post = self.posts[2]
+        post.author = other
+        post.save()
+        self.assertIsNone(cache.get(f"blogging:dashboard:{self.author.pk}"))
+        self.assertIsNone(cache.get(f"blogging:dashboard:{other.pk}"))
+        self.assertEqual(get_dashboard(other.pk)["published"]["count"], 1)
+
+    def test_rebuilt_when_latest_runs_short(self):
+        get_dashboard(self.author.pk)
+        self.posts[2].delete()
+        # Mine 1 wasn't among the latest, so the list can't be refilled.
+        self.assertIsNone(cache.get(f"blogging:dashboard:{self.author.pk}"))
+        self.assertEqual(
+            get_dashboard(self.author.pk)["published"]["latest"][1]["title"], "Mine 1"
+        )
+
+    def test_edit_keeps_untouched_fields(self):
+        post = self.posts[1]
+        self.client.post(
+            f"/posts/{post.pk}/edit/",
+            {"title": "Renamed", "author": 2, "post_date": "2021-06-02"},
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.title, post.author_id), ("Renamed", self.author.pk))
+        self.assertEqual(post.status, Post.Status.PUBLISHED)
+
+
+@no_page_cache
+class ConditionalGetTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.get(pk=1)
+        self.post = Post(
+            title="Validated",
+            text="etag me",
+            author=self.author,
+            post_date=datetime.date(2021, 6, 1),
+        )
+        self.post.save()
+
+    def revalidate(self, url):
+        etag = self.client.get(url)["ETag"]
+        return etag, self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_detail_is_not_modified(self):
+        url = f"/posts/{self.post.pk}/"
+        etag, resp = self.revalidate(url)
+        self.assertEqual(resp.status_code, 304)
+        with self.assertNumQueries(1):
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_list_is_not_modified(self):
+        etag, resp = self.revalidate("/")
+        self.assertEqual(resp.status_code, 304)
+        with self.assertNumQueries(1):
+            self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+
+    def test_changes_invalidate(self):
+        url = f"/posts/{self.post.pk}/"
+        detail_etag = self.client.get(url)["ETag"]
+        list_etag = self.client.get("/")["ETag"]
+        Comment(post=self.post, author=self.author, text="news").save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertContains(resp, "news")
+        resp = self.client.get("/", HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_page_membership_in_list_etag(self):
+        etag = self.client.get("/")["ETag"]
+        # bulk_create sends no signals, so no version or generation changes.
+        Post.objects.bulk_create(
+            [
+                Post(
+                    title="Imported",
+                    author=self.author,
+                    post_date=datetime.date(2021, 6, 2),
+                    status=Post.Status.PUBLISHED,
+                )
+            ]
+        )
+        resp = self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(resp, "Imported")
+
+    def test_same_day_edit_invalidates(self):
+        etag = self.client.get("/")["ETag"]
+        self.post.text = "edited the same day"
+        self.post.save()
+        resp = self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(resp, "edited the same day")
+
+    def test_varies_by_user(self):
+        self.author.set_password("12345")
+        self.author.save()
+        etag = self.client.get("/")["ETag"]
+        self.client.login(username="admin", password="12345")
+        resp = self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+
+class AnonymousPageCacheTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        cache.clear()
+        get_page_cache().clear()
+        self.author = User.objects.get(pk=1)
+        self.author.set_password("12345")
+        self.author.save()
+        self.post = Post(
+            title="Popular",
+            text="read by many",
+            author=self.author,
+            post_date=datetime.date(2021, 6, 1),
+        )
+        self.post.save()
+        self.other = Post(
+            title="Quiet",
+            text="read by few",
+            author=self.author,
+            post_date=datetime.date(2021, 5, 1),
+        )
+        self.other.save()
+
+    def test_repeat_views_served_from_cache(self):
+        for url in ("/", f"/posts/{self.post.pk}/"):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.content, second.content)
+
+    def test_cached_page_revalidates(self):
+        etag = self.client.get("/")["ETag"]
+        with self.assertNumQueries(0):
+            resp = self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+    def test_comment_purges_only_its_post(self):
+        self.client.get(f"/posts/{self.post.pk}/")
+        self.client.get(f"/posts/{self.other.pk}/")
+        Comment(post=self.post, author=self.author, text="fresh comment").save()
+        self.assertContains(self.client.get(f"/posts/{self.post.pk}/"), "fresh comment")
+        with self.assertNumQueries(0):
+            self.client.get(f"/posts/{self.other.pk}/")
+
+    def test_category_change_purges(self):
+        self.client.get(f"/posts/{self.post.pk}/")
+        category = Category(name="Purged", description="")
+        category.save()
+        category.posts.add(self.post)
+        self.assertContains(self.client.get(f"/posts/{self.post.pk}/"), "Purged")
+
+    def test_logged_in_bypasses_cache(self):
+        self.client.get("/")
+        self.client.login(username="admin", password="12345")
+        resp = self.client.get("/")
+        self.assertContains(resp, "logout")
+
+    def test_comment_form_not_cached(self):
+        self.client.login(username="admin", password="12345")
+        self.assertContains(
+            self.client.get(f"/posts/{self.post.pk}/"), "csrfmiddlewaretoken"
+        )
+        self.client.logout()
+        resp = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertNotContains(resp, "csrfmiddlewaretoken")
+        self.assertContains(resp, "Log in to comment")
+
+    @override_settings(
+        CACHES={
+            **settings.CACHES,
+            "pages": settings.PAGE_CACHE_BACKENDS["file"],
+        }
+    )
+    def test_file_backend(self):
+        get_page_cache().clear()
+        self.client.get("/")
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get("/"), "Popular")
+        get_page_cache().clear()
+
+
+class FeedTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.get(pk=1)
+        self.author2 = User.objects.get(pk=2)
+        self.category = Category(name="Syndicated", description="")
+        self.category.save()
+        for count in range(1, 6):
+            post = Post(
+                title=f"Feed {count} Title",
+                text=f"feed text {count}",
+                author=self.author if count % 2 else self.author2,
+                post_date=datetime.date(2021, 6, count),
+            )
+            post.save()
+            if count > 3:
+                self.category.posts.add(post)
+        Post(title="Draft in feed", text="draft", author=self.author).save()
+
+    def read(self, url, **headers):
+        resp = self.client.get(url, **headers)
+        content = b"".join(resp.streaming_content) if resp.streaming else resp.content
+        return resp, content.decode()
+
+    def test_rss(self):
+        resp, content = self.read("/feeds/rss/")
+        self.assertTrue(resp["Content-Type"].startswith("application/rss+xml"))
+        self.assertTrue(resp.streaming)
+        self.assertIn("<rss", content)
+        self.assertLess(content.index("Feed 5 Title"), content.index("Feed 1 Title"))
+        self.assertNotIn("Draft in feed", content)
+
+    def test_atom_per_author_and_category(self):
+        _, content = self.read(f"/feeds/atom/author/{self.author2.username}/")
+        self.assertIn("<feed", content)
+        self.assertIn("Feed 2 Title", content)
+        self.assertNotIn("Feed 1 Title", content)
+        _, content = self.read(f"/feeds/atom/category/{self.category.pk}/")
+        self.assertIn("Feed 4 Title", content)
+        self.assertNotIn("Feed 3 Title", content)
+        self.assertIn('term="Syndicated"', content)
+
+    @override_settings(BLOGGING_FEED_ITEMS=2)
+    def test_bounded(self):
+        _, content = self.read("/feeds/rss/")
+        self.assertEqual(content.count("<item>"), 2)
+
+    def test_cached_and_conditional(self):
+        first, content = self.read("/feeds/atom/")
+        with self.assertNumQueries(1):
+            second, cached = self.read("/feeds/atom/")
+        self.assertFalse(second.streaming)
+        self.assertEqual(content, cached)
+        resp = self.client.get("/feeds/atom/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(resp.status_code, 304)
+
+    def test_invalidated_on_edit(self):
+        etag = self.client.get("/feeds/rss/")["ETag"]
+        post = Post.objects.get(title="Feed 1 Title")
+        post.text = "edited for feed"
+        post.save()
+        resp, content = self.read("/feeds/rss/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("edited for feed", content)
+
+    def test_changes_without_generation_bump(self):
+        first, _ = self.read("/feeds/rss/")
+        Post.objects.filter(title="Draft in feed").update(
+            status=Post.Status.PUBLISHED, post_date=datetime.date(2021, 7, 1)
+        )
+        resp, content = self.read("/feeds/rss/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("Draft in feed", content)
+        again, cached = self.read("/feeds/rss/")
+        self.assertEqual((again["ETag"], cached), (resp["ETag"], content))
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get("/feeds/json/").status_code, 404)
+
+
+class CategoryViewTestCase(TestCase):
+
+    fixtures = ["blogging_test_fixture.json"]
+
+    def setUp(self):
+        self.author = User.objects.get(pk=1)
+        self.big = Category(name="Big", description="lots of posts")
+        self.big.save()
+        self.small = Category(name="Small", description="few posts")
+        self.small.save()
+        for count in range(1, 26):
+            post = Post(
+                title=f"Categorized {count}",
+                text="sorted",
+                author=self.author,
+                post_date=datetime.date(2021, 1, 1) + datetime.timedelta(count),
+            )
+            post.save()
+            self.big.posts.add(post)
+            if count < 3:
+                self.small.posts.add(post)
+        self.big.posts.add(Post.objects.create(title="Draft", author=self.author))
+
+    def test_list_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            resp = self.client.get("/categories/")
+        self.assertContains(resp, "(25 posts)")
+        self.assertContains(resp, "(2 posts)")
+
+    def test_detail_paginates_published_posts(self):
+        url = f"/categories/{self.big.pk}/"
+        resp = self.client.get(url)
+        self.assertContains(resp, "<h1>Big</h1>")
+        self.assertEqual(len(resp.context["object_list"]), 20)
+        self.assertEqual(resp.context["object_list"][0].title, "Categorized 25")
+        resp = self.client.get(f"{url}?{resp.context['page_obj'].next_querystring}")
+        self.assertEqual(len(resp.context["object_list"]), 5)
+        self.assertNotContains(resp, "Draft")
+
+    def test_missing_category(self):
+        self.assertEqual(self.client.get("/categories/9999/").status_code, 404)
+
+    def test_post_titles_values_only(self):
+        with self.assertNumQueries(1):
+            titles = self.small.post_titles()
+        self.assertEqual(sorted(titles), ["Categorized 1", "Categorized 2"])
+
+
+class TransferTestCase(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="archivist", password="pw")
+        category = Category.objects.create(name="Archive", description="old")
+        for count in range(5):
+            post = Post.objects.create(
+                title=f"Archived {count}",
+                text='kept, with "quotes"\nand lines',
+                author=self.author,
+                post_date=datetime.date(2020, 1, 1) if count % 2 else None,
+            )
+            category.posts.add(post)
+            Comment.objects.create(post=post, author=self.author, text=f"reply {count}")
+        Post.objects.update(created_date=datetime.date(2019, 5, 4))
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by("pk").values()),
+            list(Category.objects.order_by("pk").values()),
+            list(Category.posts.through.objects.order_by("pk").values()),
+            list(Comment.objects.order_by("pk").values()),
+        )
+
+    def round_trip(self, fmt, target):
+        before = self.snapshot()
+        out = io.StringIO()
+        call_command("export_blog", target, format=fmt, batch_size=2, stderr=out)
+        Category.objects.all().delete()
+        Post.objects.all().delete()
+        self.assertFalse(Comment.objects.exists())
+        call_command("import_blog", target, batch_size=2, stdout=out)
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(
+            set(get_backend().post_ids("Archived", limit=10, offset=0)),
+            set(Post.objects.published().values_list("pk", flat=True)),
+        )
+        # Sequences continue after the imported ids.
+        post = Post.objects.create(title="New", author=self.author)
+        self.assertGreater(post.pk, before[0][-1]["id"])
+
+    def test_ndjson_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.round_trip("ndjson", os.path.join(directory, "blog.ndjson"))
+
+    def test_csv_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.round_trip("csv", directory)
+
+    def test_import_rejects_unknown_model(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as source:
+            source.write('{"model": "user", "id": 1}\n')
+            source.flush()
+            with self.assertRaises(CommandError):
+                call_command("import_blog", source.name, stdout=io.StringIO())
+
+
+@no_page_cache
+@override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_SERVER_TIMING=True)
+class InstrumentationTestCase(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.author = User.objects.create_user(username="timed", password="pw")
+        self.post = Post.objects.create(
+            title="Timed", author=self.author, post_date=datetime.date(2021, 1, 1)
+        )
+
+    def test_records_queries_per_view(self):
+        resp = self.client.get(f"/posts/{self.post.pk}/")
+        self.assertIn('desc="3 queries"', resp["Server-Timing"])
+        self.client.get(f"/posts/{self.post.pk}/")
+        self.client.get("/")
+        report = registry.report()
+        self.assertEqual(report["post_detail"]["count"], 2)
+        self.assertEqual(report["post_detail"]["queries"]["p50"], 3)
+        self.assertGreater(report["post_detail"]["render"]["max"], 0)
+        self.assertEqual(report["post_index"]["count"], 1)
+
+    def test_report_is_staff_only(self):
+        self.assertEqual(self.client.get("/instrumentation/").status_code, 302)
+        self.author.is_staff = True
+        self.author.save()
+        self.client.login(username="timed", password="pw")
+        resp = self.client.get("/instrumentation/")
+        self.assertEqual(resp.json()["instrumentation_report"]["count"], 1)
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_disabled_by_default(self):
+        resp = self.client.get("/")
+        self.assertFalse(resp.has_header("Server-Timing"))
+        self.assertEqual(registry.report(), {})
+
+
+class BenchmarkCommandTestCase(TransactionTestCase):
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.json")
+            call_command(
+                "benchmark",
+                in_place=True,
+                scale=40,
+                requests=6,
+                concurrency=2,
+                output=path,
+                stderr=io.StringIO(),
+            )
+            with open(path) as report:
+                report = json.load(report)
+        self.assertEqual(report["rows"]["posts"], 40)
+        self.assertEqual(Post.objects.count(), 40)
+        for name in ("post_index", "post_detail", "post_user", "post_query"):
+            scenario = report["scenarios"][name]
+            self.assertEqual(scenario["requests"], 6)
+            self.assertEqual(scenario["errors"], {})
+            self.assertGreater(scenario["requests_per_second"], 0)
+            self.assertIn("p99", scenario["latency_ms"])
+        self.assertEqual(
+            report["scenarios"]["post_detail"]["queries_per_request"]["max"], 3
+        )
+
+
+@no_page_cache
+class ViewQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    """Every view in blogging.urls stays within the same query budget with a
+    handful of rows and with ten times as many."""
+
+    # url name: (method, maximum queries), for a logged-in staff user whose
+    # session and user lookups take two of them.
+    budgets = {
+        "post_index": ("GET", 5),
+        "post_activity": ("GET", 5),
+        "category_list": ("GET", 3),
+        "category_detail": ("GET", 5),
+        "post_search": ("GET", 5),
+        "post_detail": ("GET", 5),
+        "comment_submit": ("POST", 11),
+        "comments": ("GET", 4),
+        "edit_post": ("GET", 4),
+        "create_post": ("GET", 2),
+        "dashboard": ("GET", 2),
+        "post_user": ("GET", 5),
+        "user_published": ("GET", 5),
+        "user_not_published": ("GET", 5),
+        "post_query": ("GET", 4),
+        "post_feed": ("GET", 3),
+        "author_feed": ("GET", 4),
+        "category_feed": ("GET", 4),
+        "create_user": ("GET", 2),
+        "fragment_cache_stats": ("GET", 2),
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username="budget", password="pw", is_staff=True
+        )
+        self.client.login(username="budget", password="pw")
+        self.category = Category.objects.create(name="Budgeted")
+        self.post = None
+        self.added = 0
+
+    def grow(self, count):
+        for _ in range(count):
+            self.added += 1
+            post = Post.objects.create(
+                title=f"Budget {self.added}",
+                text="words",
+                author=self.author,
+                post_date=datetime.date(2021, 1, 1) + datetime.timedelta(self.added),
+            )
+            Post.objects.create(title=f"Draft {self.added}", author=self.author)
+            other = Category.objects.create(name=f"Other {self.added}")
+            post.categories.add(self.category, other)
+            for number in range(2):
+                Comment.objects.create(
+                    post=post, author=self.author, text=f"comment {number}"
+                )
+            self.post = self.post or post
+            Comment.objects.create(post=self.post, author=self.author, text="more")
+
+    def request(self, name):
+        pk, username = self.post.pk, self.author.username
+        paths = {
+            "post_index": "/",
+            "post_activity": "/active/",
+            "category_list": "/categories/",
+            "category_detail": f"/categories/{self.category.pk}/",
+            "post_search": "/search/?q=Budget",
+            "post_detail": f"/posts/{pk}/",
+            "comment_submit": f"/posts/{pk}/",
+            "comments": f"/posts/{pk}/comments/",
+            "edit_post": f"/posts/{pk}/edit/",
+            "create_post": "/posts/new_post/",
+            "dashboard": "/dashboard/",
+            "post_user": f"/posts/{username}/",
+            "user_published": f"/posts/{username}/published/",
+            "user_not_published": f"/posts/{username}/unpublished/",
+            "post_query": f"/posts/filter/author/{username}/",
+            "post_feed": "/feeds/rss/",
+            "author_feed": f"/feeds/atom/author/{username}/",
+            "category_feed": f"/feeds/rss/category/{self.category.pk}/",
+            "create_user": "/register/",
+            "fragment_cache_stats": "/cache/stats/",
+        }
+        method, _ = self.budgets[name]
+        if method == "POST":
+            data = {"author": self.author.pk, "post": pk, "text": "budgeted"}
+            return self.client.post(paths[name], data)
+        response = self.client.get(paths[name])
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+    def test_budgets_independent_of_data_size(self):
+        for scale in (3, 27):
+            self.grow(scale)
+            # Built once, then kept up to date as posts are saved.
+            get_dashboard(self.author.pk)
+            for name, (method, queries) in self.budgets.items():
+                with self.subTest(view=name, posts=self.added):
+                    with self.assertWithinBudget(queries):
+                        response = self.request(name)
+                    self.assertLess(response.status_code, 400)
+
+
+@no_page_cache
+@override_settings(SERVER_INTERFACE="asgi")
+class AsyncViewTestCase(TransactionTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="async", password="pw")
+        self.post = Post.objects.create(
+            title="Awaited", author=self.author, post_date=datetime.date(2021, 1, 1)
+        )
+
+    def get(self, view, path, **kwargs):
+        request = AsyncRequestFactory().get(path)
+        request.user = AnonymousUser()
+        request.session = {}
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        return async_to_sync(view)(request, **kwargs)
+
+    def test_views_render_in_worker_thread(self):
+        index = async_view(PostPostedList.as_view())
+        self.assertContains(self.get(index, "/"), "Awaited")
+        detail = async_view(PostDetail.as_view())
+        resp = self.get(detail, f"/posts/{self.post.pk}/", pk=self.post.pk)
+        self.assertContains(resp, "Awaited")
+        self.assertTrue(resp.has_header("ETag"))
+
+    def test_streaming_routes(self):
+        category = Category.objects.create(name="Streamed")
+        self.post.categories.add(category)
+        Comment.objects.create(post=self.post, author=self.author, text="Heard")
+        # Each response must arrive complete, closing tag or brace included.
+        expected = {
+            "/feeds/rss/": b"<category>Streamed</category></item>",
+            "/feeds/atom/": b"Awaited</title>",
+            "/feeds/atom/author/async/": b"Awaited</title>",
+            f"/feeds/rss/category/{category.pk}/": b"Awaited</title>",
+            "/api/posts/": b'"Awaited"',
+            f"/api/posts/{self.post.pk}/comments/": b'"Heard"',
+            "/api/categories/": b'"Streamed"',
+            f"/api/categories/{category.pk}/posts/": b'"Awaited"',
+        }
+        for path, content in expected.items():
+            with self.subTest(path=path):
+                status, body = asgi_get(path)
+                self.assertEqual(status, 200)
+                self.assertIn(content, body)
+                self.assertTrue(body.endswith((b"</rss>", b"</feed>", b"}")))
+
+    @override_settings(SERVER_INTERFACE="wsgi")
+    def test_wsgi_leaves_views_sync(self):
+        view = PostPostedList.as_view()
+        self.assertIs(async_view(view), view)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class DatabaseRoutingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        db_state.pinned = db_state.replica_read = False
+        self.addCleanup(setattr, db_state, "pinned", False)
+        self.addCleanup(setattr, db_state, "replica_read", False)
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_use_replica_until_a_write(self):
+        self.assertEqual(self.router.db_for_read(Post), "replica")
+        self.assertEqual(self.router.db_for_write(Post), "default")
+        self.assertEqual(self.router.db_for_read(Post), "default")
+        self.assertFalse(self.router.allow_migrate("replica", "blogging"))
+
+    def test_database_cache_uses_primary_without_pinning(self):
+        entry = DatabaseCache("django_blog_cache", {}).cache_model_class
+        self.assertEqual(self.router.db_for_read(entry), "default")
+        self.assertEqual(self.router.db_for_write(entry), "default")
+        self.assertFalse(is_pinned())
+
+    def test_writing_requests_pin_client_to_primary(self):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Post))
+            if request.method == "POST":
+                self.router.db_for_write(Post)
+            return HttpResponse()
+
+        middleware = PinPrimaryMiddleware(view)
+        factory = RequestFactory()
+        resp = middleware(factory.get("/"))
+        self.assertNotIn(PIN_COOKIE, resp.cookies)
+        resp = middleware(factory.post("/posts/1/"))
+        self.assertEqual(resp.cookies[PIN_COOKIE]["max-age"], 10)
+        request = factory.get("/")
+        request.COOKIES[PIN_COOKIE] = "1"
+        resp = middleware(request)
+        self.assertNotIn(PIN_COOKIE, resp.cookies)
+        self.assertEqual(seen, ["replica", "default", "default"])
+        self.assertFalse(is_pinned())
+
+    def test_failed_writes_dont_pin_client(self):
+        def view(request):
+            self.router.db_for_write(Post)
+            return HttpResponse("Too many requests.", status=429)
+
+        resp = PinPrimaryMiddleware(view)(RequestFactory().post("/posts/1/"))
+        self.assertNotIn(PIN_COOKIE, resp.cookies)
+
+    def test_replica_reads_after_invalidation_not_cached(self):
+        rendered = []
+
+        def render():
+            rendered.append(1)
+            return "fragment"
+
+        bump_post_versions([1])
+        self.assertEqual(self.router.db_for_read(Post), "replica")
+        fragment("detail", 1, render)
+        fragment("detail", 1, render)
+        self.assertEqual(len(rendered), 2)
+        later = time.time() + settings.DATABASE_PIN_SECONDS + 1
+        with mock.patch("blogging.cache.time.time", return_value=later):
+            fragment("detail", 1, render)
+        fragment("detail", 1, render)
+        self.assertEqual(len(rendered), 3)
+
+    def test_primary_reads_cached_right_after_invalidation(self):
+        bump_post_versions([1])
+        self.router.db_for_write(Post)
+        self.assertEqual(self.router.db_for_read(Post), "default")
+        self.assertTrue(is_settled(post_version(1), posts_generation()))
+
+    def test_requests_start_without_replica_reads(self):
+        def view(request):
+            self.assertFalse(read_from_replica())
+            self.router.db_for_read(Post)
+            self.assertTrue(read_from_replica())
+            return HttpResponse()
+
+        middleware = PinPrimaryMiddleware(view)
+        middleware(RequestFactory().get("/"))
+        middleware(RequestFactory().get("/"))
+        self.assertFalse(read_from_replica())
+
+    @override_settings(DATABASE_HEALTH_CHECKS=True)
+    def test_broken_persistent_connections_closed(self):
+        broken = mock.Mock(connection=object())
+        broken.is_usable.return_value = False
+        idle = mock.Mock(connection=None)
+        with mock.patch("django_blog.db.connections") as connections:
+            connections.all.return_value = [broken, idle]
+            check_connection_health()
+        broken.close.assert_called_once_with()
+        idle.is_usable.assert_not_called()
+
+
+class ApiTestCase(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="mobile", password="pw")
+        self.category = Category.objects.create(name="Apps", description="phones")
+        for count in range(1, 8):
+            post = Post.objects.create(
+                title=f"Api post {count}",
+                text="body",
+                author=self.author,
+                post_date=datetime.date(2021, 1, count),
+            )
+            post.categories.add(self.category)
+            Comment.objects.create(post=post, author=self.author, text=f"c{count}")
+        self.draft = Post.objects.create(title="Hidden draft", author=self.author)
+
+    def get_json(self, url):
+        resp = self.client.get(url)
+        if resp.streaming:
+            return resp.status_code, json.loads(b"".join(resp.streaming_content))
+        return resp.status_code, resp.json()
+
+    def test_cursor_pagination_of_published_posts(self):
+        status, page = self.get_json("/api/posts/?limit=5&fields=id,title")
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [post["title"] for post in page["results"]],
+            [f"Api post {count}" for count in range(7, 2, -1)],
+        )
+        self.assertEqual(set(page["results"][0]), {"id", "title"})
+        _, page = self.get_json(page["next"])
+        self.assertEqual(
+            [post["title"] for post in page["results"]], ["Api post 2", "Api post 1"]
+        )
+        self.assertIsNone(page["next"])
+
+    def test_sparse_fields_select_only_those_columns(self):
+        with CaptureQueriesContext(connection) as context:
+            self.get_json("/api/posts/?fields=title")
+        sql = context.captured_queries[0]["sql"]
+        self.assertIn('"title"', sql)
+        self.assertNotIn('"text"', sql)
+
+    def test_expansions_take_one_query_each(self):
+        with self.assertNumQueries(3):
+            status, page = self.get_json("/api/posts/?expand=author,categories")
+        post = page["results"][0]
+        self.assertEqual(post["author"], {"id": self.author.pk, "username": "mobile"})
+        self.assertEqual(post["categories"], [{"id": self.category.pk, "name": "Apps"}])
+
+    def test_streams_in_batches(self):
+        with mock.patch.object(PostResource, "batch_size", 2):
+            with self.assertNumQueries(1 + 4):
+                _, page = self.get_json("/api/posts/?expand=categories")
+        self.assertEqual(len(page["results"]), 7)
+
+    @override_settings(SERVER_INTERFACE="asgi")
+    def test_lists_stream_under_asgi(self):
+        status, body = asgi_get("/api/posts/", "limit=5&expand=categories")
+        self.assertEqual(status, 200)
+        page = json.loads(body)
+        self.assertEqual(len(page["results"]), 5)
+        self.assertEqual(page["results"][0]["categories"][0]["name"], "Apps")
+        self.assertIn("cursor=", page["next"])
+
+    def test_read_only(self):
+        post = Post.objects.get(title="Api post 3")
+        for url in ("/api/posts/", f"/api/posts/{post.pk}/"):
+            self.assertEqual(self.client.post(url).status_code, 405)
+            self.assertEqual(self.client.delete(url).status_code, 405)
+            self.assertEqual(self.client.head(url).status_code, 200)
+
+    def test_detail_comments_and_categories(self):
+        post = Post.objects.get(title="Api post 3")
+        status, item = self.get_json(f"/api/posts/{post.pk}/?fields=title,author")
+        self.assertEqual(item, {"title": "Api post 3", "author": "mobile"})
+        status, _ = self.get_json(f"/api/posts/{self.draft.pk}/")
+        self.assertEqual(status, 404)
+        _, page = self.get_json(f"/api/posts/{post.pk}/comments/?expand=author")
+        self.assertEqual(page["results"][0]["text"], "c3")
+        _, page = self.get_json(f"/api/categories/{self.category.pk}/posts/?limit=2")
+        self.assertEqual(len(page["results"]), 2)
+        _, item = self.get_json(f"/api/categories/{self.category.pk}/")
+        self.assertEqual(item["description"], "phones")
+
+    def test_bad_parameters(self):
+        for query in ("fields=password", "expand=comments", "limit=0", "cursor=x"):
+            status, body = self.get_json(f"/api/posts/?{query}")
+            self.assertEqual(status, 400, query)
+            self.assertIn("error", body)
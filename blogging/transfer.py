@@ -0,0 +1,66 @@
+"""
+Shared record layout of the export_blog and import_blog commands.
+
+Records are flat ``{"model": name, field: value, ...}`` mappings, written in
+dependency order so a stream can be imported front to back: categories,
+posts, category memberships, then comments. Authors are referenced by user
+id and must already exist in the target database.
+"""
+
+from contextlib import contextmanager
+
+from .models import Category, Comment, Post
+
+MODELS = {
+    "category": (Category, ["id", "name", "description"]),
+    "post": (
+        Post,
+        [
+            "id",
+            "title",
+            "text",
+            "author_id",
+            "created_date",
+            "modified_date",
+            "post_date",
+        ],
+    ),
+    "category_post": (Category.posts.through, ["id", "category_id", "post_id"]),
+    "comment": (Comment, ["id", "post_id", "author_id", "text", "created_time"]),
+}
+
+
+def to_instance(name, record):
+    """Build an unsaved model instance from an exported record, converting
+    the (string) values through the model fields."""
+    model, fields = MODELS[name]
+    values = {}
+    for attname in fields:
+        field = model._meta.get_field(attname)
+        value = record.get(attname)
+        if value in ("", None) and field.null:
+            value = None
+        values[attname] = field.to_python(value)
+    instance = model(**values)
+    if model is Post:
+        # bulk_create() doesn't call Post.save().
+        instance.refresh_status()
+    return instance
+
+
+@contextmanager
+def preserve_auto_dates():
+    """Keep exported dates instead of letting auto_now/auto_now_add fields
+    overwrite them with today's date on insert."""
+    changed = []
+    for model, _ in MODELS.values():
+        for field in model._meta.concrete_fields:
+            for flag in ("auto_now", "auto_now_add"):
+                if getattr(field, flag, False):
+                    setattr(field, flag, False)
+                    changed.append((field, flag))
+    try:
+        yield
+    finally:
+        for field, flag in changed:
+            setattr(field, flag, True)
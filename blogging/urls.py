@@ -1,4 +1,7 @@
 from django.urls import path, re_path
+from django_blog.async_views import async_view
+from .feeds import post_feed
+from .page_cache import cache_anonymous_page, post_page_version, posts_version
 from .views import (
     PostPostedList,
     PostUserNotPublished,
@@ -10,15 +13,34 @@ from .views import (
     add_comment,
     create_user,
     create_post,
+    dashboard,
     edit_post,
+    fragment_cache_stats,
+    PostSearch,
+    PostActivityList,
+    CategoryList,
+    CategoryDetail,
 )
 
 urlpatterns = [
-    path("", PostPostedList.as_view(), name="post_index"),
-    path("posts/<int:pk>/", PostDetail.as_view(), name="post_detail"),
+    path(
+        "",
+        async_view(cache_anonymous_page(PostPostedList.as_view(), posts_version)),
+        name="post_index",
+    ),
+    path("active/", PostActivityList.as_view(), name="post_activity"),
+    path("categories/", CategoryList.as_view(), name="category_list"),
+    path("categories/<int:pk>/", CategoryDetail.as_view(), name="category_detail"),
+    path("search/", PostSearch.as_view(), name="post_search"),
+    path(
+        "posts/<int:pk>/",
+        async_view(cache_anonymous_page(PostDetail.as_view(), post_page_version)),
+        name="post_detail",
+    ),
     path("posts/<int:pk>/comments/", add_comment, name="comments"),
     path("posts/<int:pk>/edit/", edit_post, name="edit_post"),
     path("posts/new_post/", create_post, name="create_post"),
+    path("dashboard/", dashboard, name="dashboard"),
     path("posts/<str:username>/", PostUserList.as_view(), name="post_user"),
     path(
         "posts/<str:username>/published/",
@@ -35,5 +57,17 @@ urlpatterns = [
         GenericSortedList.as_view(),
         name="post_query",
     ),
+    path("feeds/<str:feed_format>/", post_feed, name="post_feed"),
+    path(
+        "feeds/<str:feed_format>/author/<str:username>/",
+        post_feed,
+        name="author_feed",
+    ),
+    path(
+        "feeds/<str:feed_format>/category/<int:pk>/",
+        post_feed,
+        name="category_feed",
+    ),
     path("register/", create_user, name="create_user"),
+    path("cache/stats/", fragment_cache_stats, name="fragment_cache_stats"),
 ]
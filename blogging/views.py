@@ -1,11 +1,29 @@
+from django.http import Http404, JsonResponse
 from django.http.response import HttpResponse, HttpResponseRedirect
 from django.shortcuts import render, redirect
 from django.urls import reverse
-from .models import Post
+from .models import Category, Post
 from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
 from .forms import CommentForm, NewUserForm, PostForm
+from .pagination import (
+    CursorPage,
+    InvalidCursor,
+    KeysetPaginationMixin,
+    KeysetPaginator,
+)
+from .queries import PostQuery, QueryError
+from .search import get_backend
 from django.contrib.auth import login
+from django.contrib.admin.views.decorators import staff_member_required
+from .cache import fragment_stats
+from .comment_queue import pending_comments, record_comment
+from .dashboard import get_dashboard
+from .conditional import ConditionalDetailMixin, ConditionalListMixin
+from django.db.models import Count, Q, prefetch_related_objects
+from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django_blog.ratelimit import ratelimit
 
 
 def create_post(request, *args, **kwargs):
@@ -44,11 +62,10 @@ def edit_post(request, *args, **kwargs):
             request, "blogging/new_post.html", {"form": form, "title": "Edit Post"}
         )
     elif request.method == "POST":
-        form = PostForm(request.POST)
+        # Bound to the loaded post, so saving knows the status it had.
+        form = PostForm(request.POST, instance=post)
         if form.is_valid():
-            updated_post = form.save(commit=False)
-            updated_post.pk = kwargs["pk"]
-            updated_post.save(update_fields=["title", "text", "post_date"])
+            form.save(commit=False).save(update_fields=["title", "text", "post_date"])
             return redirect(reverse("post_detail", args=[post.pk]))
         else:
             return stub_view(request, post=form, errors=form.errors)
@@ -67,23 +84,46 @@ def stub_view(request, *args, **kwargs):
     return HttpResponse(body, content_type="text/plain")
 
 
+@ratelimit("comment", users_only=True)
 def add_comment(request, *args, **kwargs):
     form = CommentForm(request.POST)
     if request.user.id is None:
         return redirect("/login/")
     if form.is_valid():
-        model_instance = form.save(commit=False)
-        model_instance.save()
+        record_comment(form.save(commit=False))
         return redirect(f"/posts/{kwargs['pk']}/comments")
     else:
         form = CommentForm(initial={"post": kwargs["pk"], "author": request.user})
+        post = Post.objects.get(pk=kwargs["pk"])
+        comments = post.comments.select_related("author").order_by("created_time", "id")
         return render(
             request,
             "blogging/comment.html",
-            {"form": form, "post": Post.objects.get(pk=kwargs["pk"])},
+            {
+                "form": form,
+                "post": post,
+                "comments": comments,
+                "pending_comments": pending_comments(post.pk, request.user.id),
+            },
         )
 
 
+def dashboard(request, *args, **kwargs):
+    if request.user.id is None:
+        return redirect("/login/")
+    summary = get_dashboard(request.user.id)
+    sections = [
+        (status, label, summary[status]) for status, label in Post.Status.choices
+    ]
+    return render(request, "blogging/dashboard.html", {"sections": sections})
+
+
+@staff_member_required
+def fragment_cache_stats(request, *args, **kwargs):
+    return JsonResponse(fragment_stats())
+
+
+@ratelimit("register")
 def create_user(request, *args, **kwargs):
     form = NewUserForm(request.POST)
     redirect_page = request.POST.get("detail", "/")
@@ -96,30 +136,92 @@ def create_user(request, *args, **kwargs):
         return render(request, "new_user.html", {"form": form})
 
 
-class PostListAllView(ListView):
-    model = Post
+class PostListAllView(ConditionalListMixin, KeysetPaginationMixin, ListView):
+    queryset = Post.objects.for_list()
+    template_name = "blogging/list.html"
+    cursor_ordering = ("-created_date", "-id")
+
+
+class PostPostedList(ConditionalListMixin, KeysetPaginationMixin, ListView):
+    queryset = Post.objects.published().for_list().order_by("-post_date")
+    template_name = "blogging/list.html"
+    cursor_ordering = ("-post_date", "-id")
+
+
+class PostActivityList(ConditionalListMixin, KeysetPaginationMixin, ListView):
+    queryset = Post.objects.published().filter(last_comment_at__isnull=False).for_list()
     template_name = "blogging/list.html"
+    cursor_ordering = ("-last_comment_at", "-id")
+    extra_context = {"heading": "Recently discussed"}
+
 
+class CategoryList(ListView):
+    template_name = "blogging/category_list.html"
+    queryset = Category.objects.annotate(
+        post_count=Count("posts", filter=Q(posts__status=Post.Status.PUBLISHED))
+    ).order_by("name")
 
-class PostPostedList(ListView):
-    queryset = Post.objects.exclude(post_date=None).order_by("-post_date")
+
+class CategoryDetail(ConditionalListMixin, KeysetPaginationMixin, ListView):
     template_name = "blogging/list.html"
+    cursor_ordering = ("-post_date", "-id")
 
+    def get_queryset(self):
+        # Called for the ETag and again for the page; fetch the category once.
+        if not hasattr(self, "category"):
+            self.category = get_object_or_404(Category, pk=self.kwargs["pk"])
+        return Post.objects.published().filter(categories=self.category).for_list()
 
-class PostDetail(DetailView):
-    queryset = Post.objects.all()
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["heading"] = self.category.name
+        context["category"] = self.category
+        return context
+
+
+# On dispatch, so limited requests are turned away before the post is loaded.
+@method_decorator(ratelimit("comment", users_only=True), name="dispatch")
+class PostDetail(ConditionalDetailMixin, DetailView):
+    queryset = Post.objects.select_related("author")
     template_name = "blogging/detail.html"
+    comments_per_page = 50
+    comments_kwarg = "comments"
 
     def dispatch(self, request, *args, **kwargs):
-        post = Post.objects.get(pk=kwargs["pk"])
-        if request.user.id is None and post.post_date is None:
+        post = self.get_object()
+        published = post.status == Post.Status.PUBLISHED
+        if request.user.id is None and not published:
             return redirect("/login/")
-        elif request.user.id != post.author.id and post.post_date is None:
+        elif request.user.id != post.author_id and not published:
             return HttpResponse("Page Not Found", status=200)
         return super().dispatch(request, *args, **kwargs)
 
+    def get_object(self, queryset=None):
+        # dispatch() needs the post for its visibility check; keep it so
+        # DetailView.get() doesn't fetch the same row a second time.
+        if not hasattr(self, "_post"):
+            self._post = super().get_object(queryset)
+        return self._post
+
+    def get_comments_page(self, post):
+        paginator = KeysetPaginator(
+            post.comments.select_related("author"),
+            ("created_time", "id"),
+            self.comments_per_page,
+        )
+        try:
+            return paginator.page(self.request.GET.get(self.comments_kwarg))
+        except InvalidCursor:
+            raise Http404("Invalid comments cursor.")
+
     def get_context_data(self, **kwargs):
         context = super(PostDetail, self).get_context_data(**kwargs)
+        # Deferred until here so a 304 response costs a single query.
+        prefetch_related_objects([kwargs["object"]], "categories")
+        context["comments"] = self.get_comments_page(kwargs["object"])
+        context["pending_comments"] = pending_comments(
+            kwargs["object"].pk, self.request.user.id
+        )
         context["form"] = CommentForm(
             initial={"post": kwargs["object"].pk, "user": self.request.user.pk}
         )
@@ -137,46 +239,100 @@ class PostDetail(DetailView):
             }
         )
         if form.is_valid():
-            model_instance = form.save(commit=False)
-            model_instance.save()
+            record_comment(form.save(commit=False))
             return redirect(f'/posts/{kwargs["pk"]}')
         else:
             return stub_view(form_errors=form.errors)
 
 
-class PostUserList(ListView):
+class PostUserList(ConditionalListMixin, KeysetPaginationMixin, ListView):
     template_name = "blogging/list.html"
+    cursor_ordering = ("-created_date", "-id")
 
     def get_queryset(self):
-        return Post.objects.filter(author__username=self.kwargs["username"])
+        return Post.objects.filter(author__username=self.kwargs["username"]).for_list()
 
 
-class PostUserPublishedList(ListView):
+class PostUserPublishedList(ConditionalListMixin, KeysetPaginationMixin, ListView):
     template_name = "blogging/list.html"
+    cursor_ordering = ("-post_date", "-id")
 
     def get_queryset(self):
         return (
             Post.objects.filter(author__pk=self.request.user.id)
-            .exclude(post_date=None)
+            .published()
+            .for_list()
             .order_by("-post_date")
         )
 
 
-class PostUserNotPublished(ListView):
+class PostUserNotPublished(ConditionalListMixin, KeysetPaginationMixin, ListView):
     template_name = "blogging/list.html"
+    cursor_ordering = ("-created_date", "-id")
 
     def get_queryset(self):
         return (
             Post.objects.filter(author__pk=self.request.user.id)
-            .filter(post_date__isnull=True)
+            .unpublished()
+            .for_list()
             .order_by("-created_date")
         )
 
 
-class GenericSortedList(ListView):
+class GenericSortedList(KeysetPaginationMixin, ListView):
     model = Post
     template_name = "blogging/list.html"
 
     def get_queryset(self):
-        kwargs_dict = {self.kwargs["parameter"]: self.kwargs["value"]}
-        return getattr(self.model.objects, self.kwargs["command"])(**kwargs_dict)
+        try:
+            self.post_query = PostQuery(
+                self.kwargs["command"], self.kwargs["parameter"], self.kwargs["value"]
+            )
+        except QueryError as error:
+            raise Http404(str(error))
+        return self.post_query.apply(self.model.objects.for_list())
+
+    def get_cursor_ordering(self):
+        return self.post_query.ordering
+
+
+class PostSearch(KeysetPaginationMixin, ListView):
+    template_name = "blogging/list.html"
+    cursor_kwarg = "page"
+
+    def get_queryset(self):
+        return Post.objects.published().for_list()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["query"] = self.request.GET.get("q", "")
+        return context
+
+    def paginate_queryset(self, queryset, page_size):
+        # Results are ordered by rank, which can't be seeked on, so pages
+        # are numbered and fetched with LIMIT/OFFSET from the search index.
+        try:
+            number = int(self.request.GET.get(self.cursor_kwarg, 1))
+        except ValueError:
+            raise Http404("Invalid page number.")
+        if number < 1:
+            raise Http404("Invalid page number.")
+        backend = get_backend()
+        ids = []
+        if backend is not None:
+            ids = backend.post_ids(
+                self.request.GET.get("q", ""),
+                limit=page_size + 1,
+                offset=(number - 1) * page_size,
+            )
+        posts = queryset.in_bulk(ids[:page_size])
+        page = CursorPage(
+            [posts[pk] for pk in ids[:page_size] if pk in posts],
+            next_cursor=str(number + 1) if len(ids) > page_size else None,
+            previous_cursor=str(number - 1) if number > 1 else None,
+        )
+        if page.has_next():
+            page.next_querystring = self._cursor_querystring(page.next_cursor)
+        if page.has_previous():
+            page.previous_querystring = self._cursor_querystring(page.previous_cursor)
+        return (None, page, page.object_list, page.has_other_pages())
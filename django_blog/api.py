@@ -0,0 +1,158 @@
+"""
+Read-only JSON resources.
+
+A ``Resource`` maps API field names to ORM paths (or expressions) and serves
+them from ``values()`` queries, so ``?fields=id,title`` selects just those
+columns. ``?expand=`` embeds related rows, loaded with one query per batch of
+rows rather than one per row. Lists are keyset paginated - ``?limit=`` rows
+at a time, continued with the ``next`` cursor. A page is read in the view,
+then encoded into the response item by item.
+"""
+
+import json
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_safe
+
+from blogging.pagination import InvalidCursor, KeysetPaginator
+
+
+class ApiError(Exception):
+    pass
+
+
+class Expansion:
+    """Rows of ``queryset`` whose ``related`` value matches the ``key`` column
+    of the resource's rows, embedded as a list (``many``) or single object."""
+
+    def __init__(self, key, queryset, related, fields, many=False):
+        self.key = key
+        self.queryset = queryset
+        self.related = related
+        self.fields = fields
+        self.many = many
+
+    def attach(self, name, rows):
+        keys = {row[self.key] for row in rows if row[self.key] is not None}
+        found = defaultdict(list)
+        if keys:
+            related = self.queryset.filter(**{f"{self.related}__in": keys})
+            for values in related.values(self.related, *self.fields.values()):
+                found[values[self.related]].append(
+                    {field: values[path] for field, path in self.fields.items()}
+                )
+        for row in rows:
+            items = found.get(row[self.key], [])
+            row[name] = items if self.many else (items[0] if items else None)
+
+
+class Resource:
+    queryset = None
+    # API name: ORM path, or an expression to annotate.
+    fields = {}
+    expansions = {}
+    # A unique ordering, as for KeysetPaginator.
+    ordering = ("-id",)
+    default_limit = 50
+    max_limit = 1000
+    batch_size = 100
+
+    def get_queryset(self, **kwargs):
+        return self.queryset.all()
+
+    def _names(self, request, param, allowed):
+        names = [name for name in request.GET.get(param, "").split(",") if name]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise ApiError(f"Unknown {param}: {', '.join(unknown)}.")
+        return names
+
+    def parse(self, request):
+        fields = self._names(request, "fields", self.fields) or list(self.fields)
+        expand = self._names(request, "expand", self.expansions)
+        try:
+            limit = int(request.GET.get("limit", self.default_limit))
+        except ValueError:
+            raise ApiError("limit must be a number.")
+        if not 1 <= limit <= self.max_limit:
+            raise ApiError(f"limit must be between 1 and {self.max_limit}.")
+        return fields, expand, limit
+
+    def values(self, queryset, fields, expand):
+        """Select the requested fields plus the columns the ordering and the
+        expansions need."""
+        paths, annotations = set(), {}
+        for name in fields:
+            path = self.fields[name]
+            if isinstance(path, str):
+                paths.add(path)
+            else:
+                annotations[f"api_{name}"] = path
+        paths.update(name.lstrip("-") for name in self.ordering)
+        paths.update(self.expansions[name].key for name in expand)
+        return queryset.annotate(**annotations).values(*paths, *annotations)
+
+    def serialize(self, rows, fields, expand):
+        for name in expand:
+            self.expansions[name].attach(name, rows)
+        for row in rows:
+            item = {}
+            for name in fields:
+                path = self.fields[name]
+                item[name] = row[path if isinstance(path, str) else f"api_{name}"]
+            for name in expand:
+                item[name] = row[name]
+            yield item
+
+    def stream(self, items, next_url):
+        # Only encodes: under ASGI the response is iterated on the event
+        # loop, where the database can't be used.
+        encoder = DjangoJSONEncoder()
+        yield '{"results": ['
+        for count, item in enumerate(items):
+            yield (", " if count else "") + encoder.encode(item)
+        yield f'], "next": {json.dumps(next_url)}}}'
+
+    # Read-only, so anything but GET and HEAD is answered with 405.
+    @method_decorator(require_safe)
+    def list_view(self, request, **kwargs):
+        try:
+            fields, expand, limit = self.parse(request)
+            paginator = KeysetPaginator(
+                self.get_queryset(**kwargs), self.ordering, limit
+            )
+            rows = paginator.rows_after(request.GET.get("cursor"))
+        except InvalidCursor:
+            return JsonResponse({"error": "Invalid cursor."}, status=400)
+        except ApiError as error:
+            return JsonResponse({"error": str(error)}, status=400)
+        rows = list(self.values(rows, fields, expand)[: limit + 1])
+        next_url = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            params = request.GET.copy()
+            params["cursor"] = paginator.encode_cursor(rows[-1], "n")
+            next_url = request.build_absolute_uri(f"?{params.urlencode()}")
+        items = []
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start : start + self.batch_size]
+            items.extend(self.serialize(batch, fields, expand))
+        return StreamingHttpResponse(
+            self.stream(items, next_url), content_type="application/json"
+        )
+
+    @method_decorator(require_safe)
+    def detail_view(self, request, pk, **kwargs):
+        try:
+            fields, expand, _ = self.parse(request)
+        except ApiError as error:
+            return JsonResponse({"error": str(error)}, status=400)
+        queryset = self.get_queryset(**kwargs).filter(pk=pk)
+        rows = list(self.values(queryset, fields, expand))
+        if not rows:
+            return JsonResponse({"error": "Not found."}, status=404)
+        (item,) = self.serialize(rows, fields, expand)
+        return JsonResponse(item, encoder=DjangoJSONEncoder)
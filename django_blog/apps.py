@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class DjangoBlogConfig(AppConfig):
+    name = "django_blog"
+
+    def ready(self):
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+
+        from .db import check_connection_health, configure_sqlite
+
+        request_started.connect(check_connection_health)
+        connection_created.connect(configure_sqlite)
@@ -0,0 +1,58 @@
+"""
+Async entry points for read-heavy views.
+
+Django 3.2 has no async ORM, so ``async_view`` runs the wrapped view -
+database access and template rendering included - in a worker thread and
+awaits it. Under ASGI that thread comes from a pool, so requests are served
+in parallel instead of queueing for the single thread Django runs sync
+views on. With ``SERVER_INTERFACE = "wsgi"`` views are left as they are,
+since a sync server gains nothing from the extra event loop.
+
+Under ASGI, the bodies of streaming responses are iterated on the event
+loop, async view or not, so views must read everything a streamed body
+needs before returning it.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+
+from .instrumentation import timed_connections
+
+
+def _render(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, "render") and callable(response.render):
+        response.render()
+    return response
+
+
+def _render_in_pool(view, request, *args, **kwargs):
+    # Pool threads keep their own connections, which the request_started and
+    # request_finished handlers never see.
+    close_old_connections()
+    try:
+        with timed_connections():
+            return _render(view, request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    if settings.SERVER_INTERFACE != "asgi":
+        return view
+    render = sync_to_async(_render, thread_sensitive=True)
+    render_in_pool = sync_to_async(_render_in_pool, thread_sensitive=False)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # Requests from a WSGI server (runserver, the test client) stay in
+        # their own thread.
+        if isinstance(request, ASGIRequest):
+            return await render_in_pool(view, request, *args, **kwargs)
+        return await render(view, request, *args, **kwargs)
+
+    return wrapper
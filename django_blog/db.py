@@ -0,0 +1,109 @@
+"""
+Database connection handling.
+
+- ``check_connection_health`` drops persistent connections (``CONN_MAX_AGE``
+  above zero) that stopped working while idle, at the start of each request,
+  when ``DATABASE_HEALTH_CHECKS`` is set.
+- ``configure_sqlite`` applies ``SQLITE_PRAGMAS`` to new SQLite connections.
+- ``PrimaryReplicaRouter`` sends reads to the ``DATABASE_REPLICAS`` aliases
+  and writes to "default". A request that writes, and every request of that
+  client for ``DATABASE_PIN_SECONDS`` after a successful write, reads from
+  "default" too so users always see their own changes despite replication
+  lag. ``read_from_replica`` tells whether the current request read from a
+  replica, for callers deciding whether what it rendered may be cached. The
+  DatabaseCache table is always read from "default".
+"""
+
+import random
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import connections
+
+PIN_COOKIE = "pin_primary"
+_state = Local()
+
+
+def check_connection_health(**kwargs):
+    if not getattr(settings, "DATABASE_HEALTH_CHECKS", False):
+        return
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    # On the raw connection, so connection setup isn't counted as queries of
+    # the request that happened to open it.
+    for pragma, value in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+        connection.connection.execute(f"PRAGMA {pragma} = {value}")
+
+
+def pin_primary():
+    _state.pinned = True
+
+
+def is_pinned():
+    return getattr(_state, "pinned", False)
+
+
+def read_from_replica():
+    return getattr(_state, "replica_read", False)
+
+
+def _is_cache(model):
+    # The table of DatabaseCache, whose version tokens must never be read
+    # from a lagging replica.
+    return model._meta.app_label == "django_cache"
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "DATABASE_REPLICAS", [])
+        if not replicas or is_pinned() or _is_cache(model):
+            return "default"
+        _state.replica_read = True
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Filling the cache isn't a change the client needs to read back.
+        if not _is_cache(model):
+            pin_primary()
+            _state.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == "default"
+
+
+class PinPrimaryMiddleware:
+    """Pin requests that may write (anything but GET, HEAD and OPTIONS) and
+    requests from clients that wrote recently to the primary database."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.pinned = (
+            request.method not in ("GET", "HEAD", "OPTIONS")
+            or PIN_COOKIE in request.COOKIES
+        )
+        _state.wrote = _state.replica_read = False
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.pinned = _state.wrote = _state.replica_read = False
+        # Failed requests, a 429 among them, changed nothing to read back.
+        replicas = getattr(settings, "DATABASE_REPLICAS", [])
+        pin = wrote and response.status_code < 400 and replicas
+        if pin and PIN_COOKIE not in request.COOKIES:
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=settings.DATABASE_PIN_SECONDS, httponly=True
+            )
+        return response
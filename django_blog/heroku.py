@@ -3,17 +3,34 @@ import dj_database_url
 
 from .settings import *
 
+# Persistent connections, checked before reuse at the start of each request.
+CONN_MAX_AGE = int(os.environ.get("CONN_MAX_AGE", 600))
+DATABASE_HEALTH_CHECKS = True
+
 DATABASES = {
     "default": dj_database_url.config(
-        default="sqlite:///" + os.path.join(BASE_DIR, "db.sqlite3")
+        default="sqlite:///" + os.path.join(BASE_DIR, "db.sqlite3"),
+        conn_max_age=CONN_MAX_AGE,
     )
 }
+if os.environ.get("REPLICA_DATABASE_URL"):
+    DATABASES["replica"] = dj_database_url.config(
+        "REPLICA_DATABASE_URL", conn_max_age=CONN_MAX_AGE
+    )
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS = ["replica"]
+
+# Shared by every web worker and the scheduler dyno. The rate limits live in
+# this cache too (RATELIMIT_CACHE), so they hold across all web workers.
+CACHES = {**CACHES, "default": DEFAULT_CACHE_BACKENDS["database"]}
 
 DEBUG = False
 TEMPLATE_DEBUG = False
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 SECRET_KEY = os.environ.get("SECRET_KEY")
 ALLOWED_HOSTS = ["*"]
+# The Heroku router appends the client address to X-Forwarded-For.
+RATELIMIT_IP_HEADER = "HTTP_X_FORWARDED_FOR"
 
 MIDDLEWARE = (
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -0,0 +1,171 @@
+"""
+Opt-in per-view query and latency instrumentation.
+
+With ``INSTRUMENTATION_ENABLED`` set, ``InstrumentationMiddleware`` records
+for every request the number of SQL queries, time spent in the database,
+time spent rendering templates (through ``TimedDjangoTemplates``) and total
+latency, keyed by the resolved URL name. The last ``INSTRUMENTATION_SAMPLES`` requests of each
+view are kept in memory per process, and ``instrumentation_report`` serves
+their percentiles to staff. ``INSTRUMENTATION_SERVER_TIMING`` also adds the
+measurements of each response as a ``Server-Timing`` header.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+
+from asgiref.local import Local
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+METRICS = ("total", "db", "queries", "render")
+PERCENTILES = (50, 90, 99)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        size = getattr(settings, "INSTRUMENTATION_SAMPLES", 1000)
+        with self.lock:
+            self.samples = defaultdict(lambda: deque(maxlen=size))
+
+    def record(self, view_name, sample):
+        with self.lock:
+            self.samples[view_name].append(sample)
+
+    def report(self):
+        with self.lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+        return {name: summarize(values) for name, values in sorted(samples.items())}
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, -(-len(ordered) * pct // 100) - 1)
+    return ordered[index]
+
+
+def summarize(samples):
+    summary = {"count": len(samples)}
+    for position, metric in enumerate(METRICS):
+        ordered = sorted(sample[position] for sample in samples)
+        summary[metric] = {f"p{pct}": percentile(ordered, pct) for pct in PERCENTILES}
+        summary[metric]["max"] = ordered[-1]
+    return summary
+
+
+registry = MetricsRegistry()
+_current = Local()
+
+
+class RequestTimer:
+    """Counts queries, database time and template render time of one
+    request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timer = getattr(_current, "timer", None)
+        if timer is None or timer.rendering:
+            return super().render(context, request)
+        timer.rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timer.render += time.perf_counter() - start
+            timer.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing top-level renders for the
+    instrumentation middleware. Renders inside views wrapped by the page
+    cache and from ``render()`` are counted as well as TemplateResponses."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+@contextmanager
+def timed_connections():
+    """Count the queries of this thread's connections towards the current
+    request. Views running in a thread pool call this again in their worker
+    thread, which has connections of its own."""
+    timer = getattr(_current, "timer", None)
+    with ExitStack() as stack:
+        if timer is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+        yield
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 2)
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "INSTRUMENTATION_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = RequestTimer()
+        start = time.perf_counter()
+        _current.timer = timer
+        try:
+            with timed_connections():
+                response = self.get_response(request)
+        finally:
+            del _current.timer
+        total = time.perf_counter() - start
+
+        match = request.resolver_match
+        view_name = match.view_name if match else "<unresolved>"
+        sample = (
+            milliseconds(total),
+            milliseconds(timer.db),
+            timer.queries,
+            milliseconds(timer.render),
+        )
+        registry.record(view_name, sample)
+        if getattr(settings, "INSTRUMENTATION_SERVER_TIMING", False):
+            response["Server-Timing"] = (
+                f'db;dur={sample[1]};desc="{timer.queries} queries", '
+                f"render;dur={sample[3]}, total;dur={sample[0]}"
+            )
+        return response
+
+
+@staff_member_required
+def instrumentation_report(request):
+    return JsonResponse(registry.report())
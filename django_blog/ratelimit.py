@@ -0,0 +1,87 @@
+"""
+Token-bucket rate limiting for views that write.
+
+Every client gets a bucket per scope, keyed by user for logged-in requests
+and by remote address otherwise. A bucket holds up to ``tokens`` tokens and
+refills completely over ``seconds``, as configured in
+``RATELIMITS = {scope: (tokens, seconds)}``. Each limited request spends a
+token. When none is left the request is answered with 429 Too Many Requests
+before the view runs, so no form is validated and nothing is written.
+
+Buckets live in the ``RATELIMIT_CACHE`` cache. A local-memory cache limits
+each worker process separately; a shared one limits across all of them.
+"""
+
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+BUCKET_KEY = "ratelimit:{scope}:{client}"
+
+_lock = threading.Lock()
+
+
+def _logged_in(request):
+    # Without a session cookie the client can't be logged in, so skip
+    # loading the session and user from the database.
+    return (
+        settings.SESSION_COOKIE_NAME in request.COOKIES
+        and request.user.is_authenticated
+    )
+
+
+def client_key(request):
+    if _logged_in(request):
+        return f"user:{request.user.pk}"
+    address = request.META.get("REMOTE_ADDR", "")
+    header = settings.RATELIMIT_IP_HEADER
+    if header and request.META.get(header):
+        # The last address is the one added by our own proxy.
+        address = request.META[header].split(",")[-1].strip()
+    return f"ip:{address}"
+
+
+def take_token(scope, client):
+    """Spend a token from a bucket. Returns 0 on success, otherwise the
+    number of seconds until a token will be available."""
+    tokens, seconds = settings.RATELIMITS[scope]
+    rate = tokens / seconds
+    key = BUCKET_KEY.format(scope=scope, client=client)
+    cache = caches[settings.RATELIMIT_CACHE]
+    # Serializes this process's requests; with a shared cache, concurrent
+    # requests from other processes may each spend the same token.
+    with _lock:
+        now = time.time()
+        available, updated = cache.get(key, (tokens, now))
+        available = min(tokens, available + (now - updated) * rate)
+        if available < 1:
+            return (1 - available) / rate
+        cache.set(key, (available - 1, now), math.ceil(seconds))
+    return 0
+
+
+def ratelimit(scope, methods=("POST",), users_only=False):
+    """Limit requests using ``methods`` to the view to the budget configured
+    for ``scope``. With ``users_only``, anonymous requests are passed to the
+    view without spending a token, for views that turn them away anyway."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            limited = settings.RATELIMIT_ENABLED and request.method in methods
+            if limited and (_logged_in(request) or not users_only):
+                wait = take_token(scope, client_key(request))
+                if wait:
+                    response = HttpResponse("Too many requests.", status=429)
+                    response["Retry-After"] = math.ceil(wait)
+                    return response
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
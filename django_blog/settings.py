@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -38,12 +39,15 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django_blog",
     "polling",
     "blogging",
 ]
 
 MIDDLEWARE = [
+    "django_blog.instrumentation.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "django_blog.db.PinPrimaryMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -56,7 +60,7 @@ ROOT_URLCONF = "django_blog.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "django_blog.instrumentation.TimedDjangoTemplates",
         "DIRS": [
             os.path.join(BASE_DIR, "django_blog/templates"),
             os.path.join(ALT_BASE, "django_blog/templates"),
@@ -68,6 +72,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "blogging.context_processors.dashboard",
             ],
         },
     },
@@ -75,6 +80,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "django_blog.wsgi.application"
 
+# "wsgi" runs gunicorn with sync workers; "asgi" runs uvicorn workers under
+# gunicorn (see gunicorn.conf.py) and serves the read-heavy views async.
+SERVER_INTERFACE = os.environ.get("SERVER_INTERFACE", "wsgi")
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -83,9 +92,62 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {"timeout": 5},
     }
 }
 
+# Write-ahead logging lets readers carry on while a write is in progress.
+SQLITE_PRAGMAS = {"journal_mode": "WAL", "synchronous": "NORMAL"}
+
+# Aliases in DATABASES that replicate "default"; see django_blog/db.py.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ["django_blog.db.PrimaryReplicaRouter"]
+DATABASE_PIN_SECONDS = 10
+DATABASE_HEALTH_CHECKS = False
+
+# Threads per worker process, each keeping its own database connection.
+DATABASE_POOL_SIZE = int(os.environ.get("DATABASE_POOL_SIZE", 1))
+
+
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Post fragments and version tokens live in "default"; whole pages for
+# logged-out readers live in "pages". "default" must be shared by every
+# process that serves or changes posts, or a change made in one process never
+# invalidates what the others cached. The local-memory backend is only right
+# for a single process; gunicorn.conf.py runs one worker while it's in use.
+# Pages are keyed by those shared versions, so "pages" may stay per process.
+
+DEFAULT_CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Needs `manage.py createcachetable`.
+    "database": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "django_blog_cache",
+    },
+}
+DEFAULT_CACHE_BACKEND = os.environ.get("DEFAULT_CACHE_BACKEND", "locmem")
+
+PAGE_CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "pages",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(tempfile.gettempdir(), "django_blog_pages"),
+    },
+}
+PAGE_CACHE_BACKEND = os.environ.get("PAGE_CACHE_BACKEND", "locmem")
+PAGE_CACHE_TIMEOUT = 600
+
+CACHES = {
+    "default": DEFAULT_CACHE_BACKENDS[DEFAULT_CACHE_BACKEND],
+    "pages": PAGE_CACHE_BACKENDS[PAGE_CACHE_BACKEND],
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -132,3 +194,59 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 LOGIN_URL = "/login/"
 LOGIN_REDIRECT_URL = "/"
+
+# Blogging
+# Syndication feeds list at most BLOGGING_FEED_ITEMS posts and are cached for
+# BLOGGING_FEED_TIMEOUT seconds or until a post changes.
+
+BLOGGING_FEED_ITEMS = 50
+BLOGGING_FEED_TIMEOUT = 60 * 60
+# Posts listed per status on the cached dashboard of each user.
+BLOGGING_DASHBOARD_LATEST = 5
+# Posts dated in the future are published once their date comes by
+# `manage.py publish_scheduled` (run it from cron, or with --interval; it
+# needs a shared "default" cache to invalidate the web processes' caches), or
+# by a thread in each gunicorn worker when BLOGGING_PUBLISH_THREAD is set.
+BLOGGING_PUBLISH_THREAD = os.environ.get("BLOGGING_PUBLISH_THREAD") == "1"
+BLOGGING_PUBLISH_INTERVAL = 60
+# Append comments to a local spool file and insert them in batches with
+# `manage.py flush_comments --interval 5`, run on the same machine as the web
+# workers, instead of inserting one row per request. Authors' pending comments
+# are kept in the "default" cache until then.
+BLOGGING_QUEUE_COMMENTS = os.environ.get("BLOGGING_QUEUE_COMMENTS") == "1"
+BLOGGING_COMMENT_SPOOL = os.environ.get(
+    "BLOGGING_COMMENT_SPOOL", str(BASE_DIR / "spool" / "comments.jsonl")
+)
+
+# Polling
+# Buffer votes in memory per worker and write them in batches instead of
+# issuing one UPDATE per vote.
+
+POLLING_BUFFER_VOTES = os.environ.get("POLLING_BUFFER_VOTES") == "1"
+POLLING_VOTE_FLUSH_SIZE = 100
+POLLING_VOTE_FLUSH_INTERVAL = 5.0
+# Seconds to cache the summed score of polls with shard_count > 0.
+POLLING_SHARD_CACHE_TIMEOUT = 1
+
+# Rate limiting
+# Token buckets for views that write, per user or per remote address:
+# {scope: (tokens, seconds to refill them all)}. Point RATELIMIT_CACHE at a
+# cache shared by the worker processes to enforce the limits across them.
+
+RATELIMIT_ENABLED = os.environ.get("RATELIMIT_ENABLED", "1") == "1"
+RATELIMIT_CACHE = "default"
+RATELIMITS = {
+    "comment": (10, 60),
+    "vote": (30, 60),
+    "register": (5, 60 * 60),
+}
+# META key of a header holding the client address, when behind a proxy.
+RATELIMIT_IP_HEADER = None
+
+# Instrumentation
+# Per-view query counts and latencies, reported to staff at /instrumentation/.
+# Samples are kept in memory per worker process.
+
+INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION_ENABLED") == "1"
+INSTRUMENTATION_SERVER_TIMING = os.environ.get("INSTRUMENTATION_SERVER_TIMING") == "1"
+INSTRUMENTATION_SAMPLES = 1000
@@ -0,0 +1,91 @@
+"""
+Query and render-time budgets for view tests.
+
+``QueryBudgetMixin.assertWithinBudget`` fails when the wrapped block runs
+more SQL queries or takes longer than allowed, listing the queries that ran.
+Budgets are meant to be fixed numbers: checking the same budget at several
+fixture sizes catches queries that grow with the data (N+1 patterns).
+
+``asgi_get`` requests a path through Django's ASGI handler, which - unlike
+the test client - iterates streaming responses on the event loop.
+"""
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    # Seconds a single budgeted block may take, generous enough for slow CI.
+    time_budget = 1.0
+
+    @contextmanager
+    def assertWithinBudget(self, queries, seconds=None):
+        seconds = self.time_budget if seconds is None else seconds
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        elapsed = time.perf_counter() - start
+        executed = len(context.captured_queries)
+        if executed > queries:
+            self.fail(
+                f"{executed} queries executed, budget is {queries}:\n"
+                + "\n".join(
+                    f"{number}. {query['sql']}"
+                    for number, query in enumerate(context.captured_queries, 1)
+                )
+            )
+        if elapsed > seconds:
+            self.fail(f"Took {elapsed:.3f}s, budget is {seconds}s.")
+
+
+def query_budget(queries, seconds=None):
+    """Run a whole test method of a QueryBudgetMixin test case within a
+    budget."""
+
+    def decorator(test):
+        @wraps(test)
+        def budgeted(self, *args, **kwargs):
+            with self.assertWithinBudget(queries, seconds):
+                return test(self, *args, **kwargs)
+
+        return budgeted
+
+    return decorator
+
+
+def asgi_get(path, query_string=""):
+    """GET ``path`` from the ASGI application. Returns the status and the
+    complete body, raising any exception the handler raised."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "query_string": query_string.encode(),
+        "headers": [(b"host", b"testserver")],
+        "server": ("testserver", 80),
+    }
+
+    async def get():
+        communicator = ApplicationCommunicator(ASGIHandler(), scope)
+        await communicator.send_input({"type": "http.request"})
+        start = await communicator.receive_output(5)
+        body = b""
+        while True:
+            message = await communicator.receive_output(5)
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        await communicator.wait()
+        return start["status"], body
+
+    return async_to_sync(get)()
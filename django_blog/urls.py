@@ -13,14 +13,19 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth.views import LoginView, LogoutView
+from .instrumentation import instrumentation_report
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("polling/", include("polling.urls")),
+    path("api/", include("blogging.api")),
+    path("api/", include("polling.api")),
     path("", include("blogging.urls")),
     path("login/", LoginView.as_view(template_name="login.html"), name="login"),
     path("logout/", LogoutView.as_view(next_page="/"), name="logout"),
+    path("instrumentation/", instrumentation_report, name="instrumentation_report"),
 ]
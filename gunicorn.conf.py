@@ -0,0 +1,39 @@
+"""
+Gunicorn configuration, read by the Procfile's plain ``gunicorn`` command.
+
+Settings.SERVER_INTERFACE picks between sync WSGI workers and uvicorn ASGI
+workers, which keep serving while slow clients upload requests or read
+responses.
+"""
+
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_blog.settings")
+
+from django.conf import settings  # noqa: E402
+
+# Each thread of a worker keeps one persistent database connection, so
+# DATABASE_POOL_SIZE bounds the connections a worker opens.
+threads = settings.DATABASE_POOL_SIZE
+
+if settings.SERVER_INTERFACE == "asgi":
+    wsgi_app = "django_blog.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+    # Size of the thread pool async views run in.
+    os.environ.setdefault("ASGI_THREADS", str(threads))
+else:
+    wsgi_app = "django_blog.wsgi:application"
+    worker_class = "gthread" if threads > 1 else "sync"
+
+# Workers only see each other's cache invalidations through a shared cache.
+shared_cache = "LocMemCache" not in settings.CACHES["default"]["BACKEND"]
+workers = int(os.environ.get("WEB_CONCURRENCY", 2 if shared_cache else 1))
+
+
+def post_worker_init(worker):
+    # Here rather than in an AppConfig.ready(), so only web workers publish
+    # and not every migrate, shell or test run that loads the apps.
+    if settings.BLOGGING_PUBLISH_THREAD:
+        from blogging.scheduler import start_scheduler
+
+        start_scheduler(settings.BLOGGING_PUBLISH_INTERVAL)
@@ -0,0 +1,34 @@
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.urls import path
+
+from django_blog.api import Resource
+
+from .models import Poll, PollScoreShard
+
+shard_total = (
+    PollScoreShard.objects.filter(poll=OuterRef("pk"))
+    .order_by()
+    .values("poll")
+    .annotate(total=Sum("count"))
+    .values("total")
+)
+
+
+class PollResource(Resource):
+    queryset = Poll.objects.all()
+    fields = {
+        "id": "id",
+        "title": "title",
+        "text": "text",
+        # Includes votes counted on shards; see polling.votes.
+        "score": F("score") + Coalesce(Subquery(shard_total), 0),
+    }
+
+
+polls = PollResource()
+
+urlpatterns = [
+    path("polls/", polls.list_view, name="api_polls"),
+    path("polls/<int:pk>/", polls.detail_view, name="api_poll"),
+]
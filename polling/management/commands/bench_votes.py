@@ -0,0 +1,64 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from polling.models import Poll
+from polling.votes import record_vote, total_score
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare vote throughput of a single-row poll score with a sharded "
+        "counter by voting concurrently from several threads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--votes", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--shards", type=int, default=16)
+
+    def run(self, poll, votes, threads):
+        per_thread = votes // threads
+        errors = []
+
+        def vote():
+            try:
+                for _ in range(per_thread):
+                    record_vote(poll, 1)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=vote) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        return per_thread * threads, elapsed, errors
+
+    def handle(self, *args, **options):
+        polls = {
+            "single row": Poll.objects.create(title="bench: single row"),
+            f"{options['shards']} shards": Poll.objects.create(
+                title="bench: sharded", shard_count=options["shards"]
+            ),
+        }
+        try:
+            for label, poll in polls.items():
+                votes, elapsed, errors = self.run(
+                    poll, options["votes"], options["threads"]
+                )
+                poll.refresh_from_db()
+                self.stdout.write(
+                    f"{label}: {votes} votes in {elapsed:.2f}s "
+                    f"({votes / elapsed:.0f} votes/s), "
+                    f"score {total_score(poll)}, {len(errors)} errors"
+                )
+        finally:
+            for poll in polls.values():
+                poll.delete()
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.2 on 2026-10-18 19:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("polling", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="poll",
+            name="shard_count",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                help_text="Spread votes over this many counter rows (0 keeps them on score).",
+            ),
+        ),
+        migrations.CreateModel(
+            name="PollScoreShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveSmallIntegerField()),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "poll",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shards",
+                        to="polling.poll",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="pollscoreshard",
+            constraint=models.UniqueConstraint(
+                fields=("poll", "index"), name="unique_poll_score_shard"
+            ),
+        ),
+    ]
@@ -7,6 +7,26 @@ class Poll(models.Model):
     title = models.CharField(max_length=128)
     text = models.TextField(blank=True)
     score = models.IntegerField(default=0)
+    shard_count = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Spread votes over this many counter rows (0 keeps them on score).",
+    )
 
     def __str__(self):
         return self.title
+
+
+class PollScoreShard(models.Model):
+    poll = models.ForeignKey(Poll, on_delete=models.CASCADE, related_name="shards")
+    index = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["poll", "index"], name="unique_poll_score_shard"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.poll} [{self.index}]: {self.count}"
@@ -1,3 +1,219 @@
-from django.test import TestCase
+import json
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+
+from django_blog.testing import QueryBudgetMixin, asgi_get, query_budget
+
+from . import votes
+from .models import Poll, PollScoreShard
+from .votes import (
+    VoteFlusher,
+    current_score,
+    record_vote,
+    total_score,
+    vote_buffer,
+)
+
+
+class VoteTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.poll = Poll(title="Is this fast?", text="Vote now.")
+        self.poll.save()
+
+    def test_vote_yes_and_no(self):
+        resp = self.client.post(f"/polling/polls/{self.poll.pk}/", {"vote": "Yes"})
+        self.assertContains(resp, "Current score: 1")
+        resp = self.client.post(f"/polling/polls/{self.poll.pk}/", {"vote": "No"})
+        self.assertContains(resp, "Current score: 0")
+
+    def test_stale_instances_do_not_lose_votes(self):
+        first = Poll.objects.get(pk=self.poll.pk)
+        second = Poll.objects.get(pk=self.poll.pk)
+        record_vote(first, 1)
+        record_vote(second, 1)
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.score, 2)
+
+    def test_vote_updates_only_score(self):
+        Poll.objects.filter(pk=self.poll.pk).update(title="Renamed elsewhere")
+        self.client.post(f"/polling/polls/{self.poll.pk}/", {"vote": "Yes"})
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.title, "Renamed elsewhere")
+
+
+@override_settings(
+    POLLING_BUFFER_VOTES=True,
+    POLLING_VOTE_FLUSH_SIZE=5,
+    POLLING_VOTE_FLUSH_INTERVAL=3600,
+)
+class BufferedVoteTestCase(TestCase):
+    def setUp(self):
+        self.poll = Poll(title="Buffered", text="Vote now.")
+        self.poll.save()
+        self.addCleanup(vote_buffer.stop)
+        self.addCleanup(vote_buffer.flush)
+
+    def test_votes_buffered_until_flush_size(self):
+        for _ in range(4):
+            resp = self.client.post(f"/polling/polls/{self.poll.pk}/", {"vote": "Yes"})
+        self.assertContains(resp, "Current score: 4")
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.score, 0)
+        self.client.post(f"/polling/polls/{self.poll.pk}/", {"vote": "No"})
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.score, 3)
+        self.assertEqual(current_score(self.poll), 3)
+
+    def test_failed_flush_applies_nothing_twice(self):
+        other = Poll.objects.create(title="Second", text="Vote now.")
+        record_vote(self.poll, 1)
+        record_vote(other, 1)
+        real_increment = votes._increment
+
+        def fail_on_other(poll_id, shard_count, delta):
+            if poll_id == other.pk:
+                raise DatabaseError("lost connection")
+            real_increment(poll_id, shard_count, delta)
+
+        with mock.patch("polling.votes._increment", side_effect=fail_on_other):
+            with self.assertRaises(DatabaseError):
+                vote_buffer.flush()
+        vote_buffer.flush()
+        for poll in (self.poll, other):
+            poll.refresh_from_db()
+            self.assertEqual(poll.score, 1)
+
+    def test_flush_writes_pending_votes(self):
+        record_vote(self.poll, 1)
+        record_vote(self.poll, 1)
+        vote_buffer.flush()
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.score, 2)
+
+    def test_empty_flush_skips_database(self):
+        with self.assertNumQueries(0):
+            vote_buffer.flush()
+
+    def test_first_vote_starts_flusher(self):
+        vote_buffer.stop()
+        with mock.patch("polling.votes.atexit.register") as register:
+            record_vote(self.poll, 1)
+            record_vote(self.poll, 1)
+        register.assert_called_once_with(vote_buffer.flush)
+        self.assertTrue(vote_buffer.flusher.is_alive())
+        self.assertEqual(vote_buffer.flusher.interval, 3600)
+
+    def test_flusher_flushes_every_interval(self):
+        buffer = mock.Mock()
+        flushed = threading.Event()
+        buffer.flush.side_effect = flushed.set
+        flusher = VoteFlusher(buffer, 0.01)
+        flusher.start()
+        self.addCleanup(flusher.join)
+        self.addCleanup(flusher.stop)
+        self.assertTrue(flushed.wait(5))
+
+
+class ShardedVoteTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.poll = Poll(title="Viral", text="Vote now.", score=10, shard_count=4)
+        self.poll.save()
+
+    def test_votes_spread_over_shards(self):
+        for _ in range(40):
+            record_vote(self.poll, 1)
+        shards = PollScoreShard.objects.filter(poll=self.poll)
+        self.assertLessEqual(shards.count(), 4)
+        self.assertEqual(sum(shard.count for shard in shards), 40)
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.score, 10)
+        self.assertEqual(total_score(self.poll), 50)
+
+    def test_cached_total_follows_own_votes(self):
+        self.assertEqual(total_score(self.poll), 10)
+        record_vote(self.poll, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(total_score(self.poll), 11)
+
+    def test_detail_view_shows_summed_score(self):
+        resp = self.client.post(f"/polling/polls/{self.poll.pk}/", {"vote": "Yes"})
+        self.assertContains(resp, "Current score: 11")
+        resp = self.client.get(f"/polling/polls/{self.poll.pk}/")
+        self.assertContains(resp, "Current score: 11")
+
+
+@override_settings(RATELIMITS={"vote": (2, 60)})
+class VoteRateLimitTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.poll = Poll.objects.create(title="Limited", text="Vote now.")
+
+    def test_votes_limited(self):
+        url = f"/polling/polls/{self.poll.pk}/"
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, {"vote": "Yes"}).status_code, 200)
+        with self.assertNumQueries(0):
+            resp = self.client.post(url, {"vote": "Yes"})
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp["Retry-After"], "30")
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.score, 2)
+
+
+class ViewQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.polls = []
+
+    def grow(self, count):
+        for number in range(count):
+            poll = Poll.objects.create(title=f"Poll {number}", shard_count=number % 3)
+            record_vote(poll, 1)
+            self.polls.append(poll)
+
+    def test_budgets_independent_of_data_size(self):
+        for scale in (3, 27):
+            self.grow(scale)
+            poll = self.polls[-1]
+            with self.subTest(polls=len(self.polls)):
+                with self.assertWithinBudget(1):
+                    self.client.get("/polling/")
+                with self.assertWithinBudget(2):
+                    self.client.get(f"/polling/polls/{poll.pk}/")
+                # The first vote on a shard inserts it inside a savepoint.
+                with self.assertWithinBudget(6):
+                    self.client.post(f"/polling/polls/{poll.pk}/", {"vote": "Yes"})
+
+    @query_budget(1)
+    def test_empty_index(self):
+        self.assertContains(self.client.get("/polling/"), "</html>", html=False)
+
+
+class PollApiTestCase(TestCase):
+    def test_score_includes_shards(self):
+        cache.clear()
+        poll = Poll.objects.create(title="Sharded", score=5, shard_count=4)
+        for _ in range(3):
+            record_vote(poll, 1)
+        Poll.objects.create(title="Plain", score=2)
+        resp = self.client.get("/api/polls/?fields=title,score")
+        results = json.loads(b"".join(resp.streaming_content))["results"]
+        self.assertEqual(
+            results, [{"title": "Plain", "score": 2}, {"title": "Sharded", "score": 8}]
+        )
+        resp = self.client.get(f"/api/polls/{poll.pk}/?fields=score")
+        self.assertEqual(resp.json(), {"score": 8})
+
+    @override_settings(SERVER_INTERFACE="asgi")
+    def test_list_streams_under_asgi(self):
+        Poll.objects.create(title="Async", score=1)
+        status, body = asgi_get("/api/polls/", "fields=title")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["results"], [{"title": "Async"}])
@@ -1,7 +1,8 @@
 from django.urls import path
+from django_blog.async_views import async_view
 from .views import list_view, detail_view, PollDetailView, PollListView
 
 urlpatterns = [
-    path("", PollListView.as_view(), name="poll_index"),
+    path("", async_view(PollListView.as_view()), name="poll_index"),
     path("polls/<int:pk>/", PollDetailView.as_view(), name="poll_detail"),
 ]
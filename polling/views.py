@@ -1,8 +1,11 @@
 from django.shortcuts import render
 from django.http import Http404
 from .models import Poll
+from .votes import current_score, record_vote
 from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
+from django.utils.decorators import method_decorator
+from django_blog.ratelimit import ratelimit
 
 
 class PollListView(ListView):
@@ -10,18 +13,21 @@ class PollListView(ListView):
     template_name = "polling/list.html"
 
 
+@method_decorator(ratelimit("vote"), name="dispatch")
 class PollDetailView(DetailView):
     model = Poll
     template_name = "polling/detail.html"
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["score"] = current_score(self.object)
+        return context
+
     def post(self, request, *args, **kwargs):
         poll = self.get_object()
-        if request.POST.get("vote") == "Yes":
-            poll.score += 1
-        else:
-            poll.score -= 1
-        poll.save()
-        context = {"object": poll}
+        record_vote(poll, 1 if request.POST.get("vote") == "Yes" else -1)
+        poll.refresh_from_db(fields=["score"])
+        context = {"object": poll, "score": current_score(poll)}
         return render(request, "polling/detail.html", context)
 
 
@@ -30,6 +36,7 @@ def list_view(request):
     return render(request, "polling/list.html", context)
 
 
+@ratelimit("vote")
 def detail_view(request, poll_id):
     try:
         poll = Poll.objects.get(pk=poll_id)
@@ -37,11 +44,8 @@ def detail_view(request, poll_id):
         raise Http404
 
     if request.method == "POST":
-        if request.POST.get("vote") == "Yes":
-            poll.score += 1
-        else:
-            poll.score -= 1
-        poll.save()
+        record_vote(poll, 1 if request.POST.get("vote") == "Yes" else -1)
+        poll.refresh_from_db(fields=["score"])
 
-    context = {"poll": poll}
+    context = {"poll": poll, "object": poll, "score": current_score(poll)}
     return render(request, "polling/detail.html", context)
@@ -0,0 +1,180 @@
+import atexit
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F, Sum
+
+from .models import Poll, PollScoreShard
+
+SCORE_CACHE_KEY = "polling:score:{pk}"
+
+logger = logging.getLogger(__name__)
+
+
+def _increment_shard(poll_id, shard_count, delta):
+    """Add ``delta`` to one randomly chosen counter row of a sharded poll, so
+    concurrent voters mostly lock different rows."""
+    index = random.randrange(shard_count)
+    shard = PollScoreShard.objects.filter(poll_id=poll_id, index=index)
+    if shard.update(count=F("count") + delta):
+        return
+    try:
+        with transaction.atomic():
+            PollScoreShard.objects.create(poll_id=poll_id, index=index, count=delta)
+    except IntegrityError:
+        # Another request created the row first.
+        shard.update(count=F("count") + delta)
+
+
+def _increment(poll_id, shard_count, delta):
+    if not shard_count:
+        Poll.objects.filter(pk=poll_id).update(score=F("score") + delta)
+        return
+    _increment_shard(poll_id, shard_count, delta)
+    try:
+        cache.incr(SCORE_CACHE_KEY.format(pk=poll_id), delta)
+    except ValueError:
+        pass
+
+
+def apply_votes(deltas):
+    """Add each ``{poll_id: delta}`` to the poll's score with a database-side
+    increment, so concurrent votes can't overwrite one another."""
+    deltas = {poll_id: delta for poll_id, delta in deltas.items() if delta}
+    shard_counts = dict(
+        Poll.objects.filter(pk__in=deltas).values_list("pk", "shard_count")
+    )
+    for poll_id, delta in deltas.items():
+        if poll_id in shard_counts:
+            _increment(poll_id, shard_counts[poll_id], delta)
+
+
+class VoteFlusher(threading.Thread):
+    """Daemon thread flushing a VoteBuffer every ``interval`` seconds, so
+    votes buffered at the end of a burst are still written."""
+
+    def __init__(self, buffer, interval):
+        super().__init__(name="polling-vote-flusher", daemon=True)
+        self.buffer = buffer
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.buffer.flush()
+            except DatabaseError:
+                logger.exception("Flushing buffered votes failed.")
+            finally:
+                # Don't hold a connection open between runs.
+                connection.close()
+
+    def stop(self):
+        self.stopped.set()
+
+
+class VoteBuffer:
+    """Per-process accumulator of vote deltas.
+
+    Votes are summed in memory and written with one UPDATE per poll once
+    ``POLLING_VOTE_FLUSH_SIZE`` votes have been buffered or the oldest one is
+    ``POLLING_VOTE_FLUSH_INTERVAL`` seconds old, and when the process exits.
+    The first buffered vote starts a VoteFlusher thread, which checks the age
+    when no further votes arrive.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(int)
+        self.count = 0
+        self.started = None
+        self.flusher = None
+
+    def _start_flusher(self):
+        # Called with the lock held, so the thread and the exit hook are
+        # only set up once.
+        if self.flusher is None:
+            self.flusher = VoteFlusher(self, settings.POLLING_VOTE_FLUSH_INTERVAL)
+            self.flusher.start()
+            atexit.register(self.flush)
+
+    def add(self, poll_id, delta):
+        now = time.monotonic()
+        with self.lock:
+            self._start_flusher()
+            self.pending[poll_id] += delta
+            self.count += 1
+            if self.started is None:
+                self.started = now
+            due = (
+                self.count >= settings.POLLING_VOTE_FLUSH_SIZE
+                or now - self.started >= settings.POLLING_VOTE_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def pending_for(self, poll_id):
+        with self.lock:
+            return self.pending.get(poll_id, 0)
+
+    def flush(self):
+        with self.lock:
+            deltas = dict(self.pending)
+            self.pending.clear()
+            self.count = 0
+            self.started = None
+        if not deltas:
+            return
+        try:
+            # All or nothing, so deltas put back after a failure were not
+            # applied to any poll.
+            with transaction.atomic():
+                apply_votes(deltas)
+        except Exception:
+            with self.lock:
+                for poll_id, delta in deltas.items():
+                    self.pending[poll_id] += delta
+            raise
+
+    def stop(self):
+        """Stop the flusher thread and drop the exit hook."""
+        with self.lock:
+            if self.flusher is not None:
+                self.flusher.stop()
+                atexit.unregister(self.flush)
+                self.flusher = None
+
+
+vote_buffer = VoteBuffer()
+
+
+def record_vote(poll, delta):
+    if settings.POLLING_BUFFER_VOTES:
+        vote_buffer.add(poll.pk, delta)
+    else:
+        _increment(poll.pk, poll.shard_count, delta)
+
+
+def total_score(poll):
+    """The stored score of a poll, summing its counter rows if it is sharded.
+    Sharded totals are cached for ``POLLING_SHARD_CACHE_TIMEOUT`` seconds."""
+    if not poll.shard_count:
+        return poll.score
+    key = SCORE_CACHE_KEY.format(pk=poll.pk)
+    score = cache.get(key)
+    if score is None:
+        shards = poll.shards.aggregate(total=Sum("count"))["total"] or 0
+        score = poll.score + shards
+        cache.add(key, score, settings.POLLING_SHARD_CACHE_TIMEOUT)
+    return score
+
+
+def current_score(poll):
+    """The stored score plus any votes this process hasn't flushed yet."""
+    return total_score(poll) + vote_buffer.pending_for(poll.pk)